@@ -3,8 +3,6 @@ from dotenv import load_dotenv
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts.chat import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import SystemMessage
-from langchain.memory import ConversationBufferMemory
 from langchain.schema.runnable import RunnableSequence
 from langchain.callbacks.base import BaseCallbackHandler
 from langchain.tools import Tool
@@ -14,6 +12,9 @@ from datetime import datetime
 import requests
 
 from akari_tools import tools
+from akari_sessions import SessionStore
+from akari_tts import tts_worker
+from akari_playback import scheduler_for, PRIORITY_SYSTEM
 
 
 load_dotenv()
@@ -27,26 +28,31 @@ llm = ChatGoogleGenerativeAI(
     temperature=0.7
 )
 
-memory = ConversationBufferMemory(
-    memory_key="chat_history",
-    return_messages=True,
-    output_key="output"
-)
+sessions = SessionStore(llm)
+
+SEARCH_ANNOUNCEMENT = "マスターの代わりに検索してみるね！"
 
 class SearchAnnounceHandler(BaseCallbackHandler):
-    def __init__(self, ctx):
-        self.ctx = ctx
+    def __init__(self, channel, generation: int = None):
+        self.channel = channel
+        self.generation = generation
         self.search_count = 0
 
     async def on_tool_start(self, tool, input_str, **kwargs):
         tool_name = tool.get("name") if isinstance(tool, dict) else getattr(tool, "name", None)
         if tool_name == "WebSearch":
             self.search_count += 1
-            await self.ctx.send("🔍 マスターの代わりに検索してみるね！")
+            await self.channel.send(f"🔍 {SEARCH_ANNOUNCEMENT}")
+            guild = getattr(self.channel, "guild", None)
+            if guild and guild.voice_client:
+                scheduler_for(guild).enqueue(
+                    tts_worker.submit(SEARCH_ANNOUNCEMENT), PRIORITY_SYSTEM, self.generation
+                )
 
 
+# 会話の要約はシステムプロンプトの末尾に {summary} として差し込む（システムメッセージは1つだけにする）
 prompt = ChatPromptTemplate.from_messages([
-    SystemMessage(content=system_prompt),
+    ("system", system_prompt.replace("{", "{{").replace("}", "}}") + "{summary}"),
     MessagesPlaceholder(variable_name="chat_history"),
     ("human", "{input}")
 ])
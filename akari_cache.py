@@ -0,0 +1,70 @@
+import os
+import json
+import time
+import threading
+import unicodedata
+
+# ツールの結果をディスクに保存する小さなキー・バリューキャッシュ。
+# ttl=None のエントリは期限切れにならない。
+
+
+def normalize_key(text: str) -> str:
+    """全角/半角・大文字/小文字・空白・句読点の違いを吸収したキャッシュキーを返す"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return "".join(ch for ch in text if not ch.isspace() and unicodedata.category(ch)[0] != "P")
+
+
+class JsonCache:
+    def __init__(self, path: str, ttl: float = None):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._data = {}
+        return self._data
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._load().get(key)
+            if entry is None or (self.ttl is not None and time.time() - entry["stored_at"] > self.ttl):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry["value"]
+
+    def set(self, key: str, value):
+        with self._lock:
+            data = self._load()
+            now = time.time()
+            if self.ttl is not None:
+                for expired in [k for k, v in data.items() if now - v["stored_at"] > self.ttl]:
+                    del data[expired]
+            data[key] = {"value": value, "stored_at": now}
+            self._save()
+
+    def preload(self, entries: dict):
+        """未登録のキーだけを保存せずに追加する"""
+        with self._lock:
+            data = self._load()
+            for key, value in entries.items():
+                data.setdefault(key, {"value": value, "stored_at": time.time()})
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return f"hit={self.hits}, miss={self.misses}（ヒット率 {rate:.0f}%）"
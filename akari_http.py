@@ -0,0 +1,65 @@
+import asyncio
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+# ツールから外部APIを呼ぶための共有HTTPクライアント。
+# 同期版（requests.Session）と非同期版（aiohttp.ClientSession）の両方で
+# keep-alive の接続を使い回し、接続・読み取りのタイムアウトを必ず設定する。
+
+CONNECT_TIMEOUT = 5   # 秒
+READ_TIMEOUT = 30     # 秒
+LIMIT_PER_HOST = 8
+
+_session = None
+_async_session = None
+_async_session_loop = None
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=LIMIT_PER_HOST, pool_maxsize=LIMIT_PER_HOST)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+
+def get_async_session() -> aiohttp.ClientSession:
+    """実行中のイベントループ用の ClientSession を返す（ループごとに1つ）"""
+    global _async_session, _async_session_loop
+    loop = asyncio.get_running_loop()
+    if _async_session is None or _async_session.closed or _async_session_loop is not loop:
+        connector = aiohttp.TCPConnector(limit_per_host=LIMIT_PER_HOST, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+        _async_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        _async_session_loop = loop
+    return _async_session
+
+
+def get_json(url: str, params=None, headers=None):
+    response = get_session().get(url, params=params, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    return response.json()
+
+
+def post_json(url: str, payload, headers=None):
+    response = get_session().post(url, json=payload, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    return response.json()
+
+
+async def aget_json(url: str, params=None, headers=None):
+    async with get_async_session().get(url, params=params, headers=headers) as response:
+        return await response.json(content_type=None)
+
+
+async def apost_json(url: str, payload, headers=None):
+    async with get_async_session().post(url, json=payload, headers=headers) as response:
+        return await response.json(content_type=None)
+
+
+async def aclose():
+    global _async_session
+    if _async_session is not None and not _async_session.closed:
+        await _async_session.close()
+    _async_session = None
@@ -0,0 +1,99 @@
+import os
+from langchain_core.messages import AIMessage, HumanMessage
+
+# トークン予算つきの会話メモリ。
+# 直近の会話はそのまま残し、予算を超えた古い会話は要約に畳み込む。
+# ツールの結果は全文ではなく先頭だけを残す。
+
+MAX_HISTORY_TOKENS = int(os.getenv("AKARI_MEMORY_TOKENS", 2000))
+KEEP_RECENT_MESSAGES = 6
+TOOL_OUTPUT_CHARS = 300
+TOOL_OUTPUT_PREFIX = "[toolの結果]: "
+
+SUMMARY_PROMPT = (
+    "あなたは会話ログの要約係です。\n"
+    "これまでの要約に新しい会話を取り込み、マスターとあかりの会話の要約を日本語で更新してください。\n"
+    "マスターについて分かった事実、約束や予定、話題の流れを優先し、300文字以内にまとめてください。\n\n"
+    "【これまでの要約】\n{summary}\n\n"
+    "【新しい会話】\n{conversation}\n\n"
+    "【更新後の要約】"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Gemini のトークン数の概算（日本語はほぼ1文字1トークン、英数字は4文字1トークン）"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+
+def compact_tool_output(tool_output: str) -> str:
+    text = " / ".join(line.strip() for line in tool_output.splitlines() if line.strip())
+    if len(text) > TOOL_OUTPUT_CHARS:
+        text = text[:TOOL_OUTPUT_CHARS] + "…（省略）"
+    return TOOL_OUTPUT_PREFIX + text
+
+
+def _format_line(message) -> str:
+    speaker = "マスター" if message.type == "human" else "あかり"
+    return f"{speaker}: {message.content}"
+
+
+class AkariMemory:
+    def __init__(self, llm, max_tokens: int = MAX_HISTORY_TOKENS, keep_recent: int = KEEP_RECENT_MESSAGES):
+        self.llm = llm
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.summary = ""
+        self.recent = []
+
+    @property
+    def messages(self):
+        """refiner の chat_history に渡す直近の会話"""
+        return list(self.recent)
+
+    def summary_text(self) -> str:
+        """refiner のシステムプロンプトの末尾に足す要約（要約がなければ空）"""
+        return f"\n\nこれまでの会話の要約: {self.summary}" if self.summary else ""
+
+    def history_text(self) -> str:
+        """エージェントの入力に埋め込む会話履歴のテキスト"""
+        lines = [f"（これまでの会話の要約: {self.summary}）"] if self.summary else []
+        lines += [_format_line(m) for m in self.recent]
+        return "\n".join(lines)
+
+    def token_count(self) -> int:
+        return estimate_tokens(self.summary) + sum(estimate_tokens(m.content) for m in self.recent)
+
+    def add_turn(self, user_message: str, reply: str, tool_output: str = None):
+        """1ターン分のメッセージを追加し、追加したメッセージを返す"""
+        added = [HumanMessage(content=user_message)]
+        if tool_output:
+            added.append(AIMessage(content=compact_tool_output(tool_output)))
+        added.append(AIMessage(content=reply))
+        self.recent.extend(added)
+        return added
+
+    async def acompact(self) -> bool:
+        """予算を超えていれば、直近 keep_recent 件より古い会話を要約に畳み込む。畳み込んだら True"""
+        if self.token_count() <= self.max_tokens or len(self.recent) <= self.keep_recent:
+            return False
+        # 要約を待つあいだに追加されたターンを失わないよう、畳み込む件数だけを控える
+        n_old = len(self.recent) - self.keep_recent
+        old = self.recent[:n_old]
+        prompt = SUMMARY_PROMPT.format(
+            summary=self.summary or "（なし）",
+            conversation="\n".join(_format_line(m) for m in old),
+        )
+        try:
+            result = await self.llm.ainvoke(prompt)
+        except Exception as e:
+            print(f"[メモリ] 要約に失敗したため履歴をそのまま保持します: {e}")
+            return False
+        self.summary = result.content.strip()
+        self.recent = self.recent[n_old:]
+        print(f"[メモリ] {len(old)}件を要約に畳み込みました（約{self.token_count()}トークン）")
+        return True
+
+    def clear(self):
+        self.summary = ""
+        self.recent = []
@@ -0,0 +1,105 @@
+import io
+import asyncio
+import itertools
+from discord import FFmpegPCMAudio
+
+# サーバー（guild）ごとの再生スケジューラー。
+# 音声は優先度つきの FIFO に積まれ、前の音声の after= コールバックで次を再生する。
+# 新しい発話を認識したら barge_in() で再生中の音声と待ち行列を止める。
+# 会話のターンは開始時の generation を控えて enqueue() に渡し、割り込まれたあとの音声は積まれない。
+
+PRIORITY_SYSTEM = 0   # 「検索してみるね」などの短いお知らせ
+PRIORITY_ANSWER = 1   # 会話の返答
+
+
+def audio_source(audio: bytes) -> FFmpegPCMAudio:
+    """合成済みWAVのバイト列をそのまま FFmpeg にパイプで渡す"""
+    return FFmpegPCMAudio(io.BytesIO(audio), pipe=True)
+
+
+class PlaybackScheduler:
+    def __init__(self, guild):
+        self.guild = guild
+        self._queue = None
+        self._task = None
+        self._seq = itertools.count()
+        self._generation = 0
+        self._pending_audio = None  # _run が合成を待っている Future
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.PriorityQueue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    @property
+    def generation(self) -> int:
+        """barge_in() のたびに増える番号。ターンの開始時に控えておく"""
+        return self._generation
+
+    def enqueue(self, audio, priority: int = PRIORITY_ANSWER, generation: int = None) -> asyncio.Future:
+        """
+        音声（WAVのバイト列、またはそれを返す Future）を再生待ちに積む。
+        generation を渡すと、それより後に barge_in() されていれば積まずに取り消す。
+        戻り値の Future は再生が終わるか、取り消されたときに完了する。
+        """
+        done = asyncio.get_running_loop().create_future()
+        if generation is not None and generation != self._generation:
+            done.set_result(False)
+            return done
+        self._ensure_started()
+        self._queue.put_nowait((priority, next(self._seq), self._generation, audio, done))
+        return done
+
+    def barge_in(self):
+        """再生中の音声を止め、待っている音声をすべて取り消す（合成前の音声は合成もしない）"""
+        self._generation += 1
+        if self._pending_audio is not None:
+            self._pending_audio.cancel()
+        if self._queue is not None:
+            while not self._queue.empty():
+                *_, audio, done = self._queue.get_nowait()
+                if asyncio.isfuture(audio):
+                    audio.cancel()
+                if not done.done():
+                    done.set_result(False)
+        vc = self.guild.voice_client
+        if vc and vc.is_playing():
+            vc.stop()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, generation, audio, done = await self._queue.get()
+            try:
+                if asyncio.isfuture(audio):
+                    if generation != self._generation:
+                        audio.cancel()
+                        continue
+                    # barge_in() で取り消されても _run が止まらないよう、wait で完了だけを待つ
+                    self._pending_audio = audio
+                    await asyncio.wait([audio])
+                    self._pending_audio = None
+                    if audio.cancelled():
+                        continue
+                    audio = audio.result()
+                vc = self.guild.voice_client
+                if generation != self._generation or vc is None or not vc.is_connected():
+                    continue
+                finished = asyncio.Event()
+                vc.play(audio_source(audio), after=lambda e: loop.call_soon_threadsafe(finished.set))
+                await finished.wait()
+            except Exception as e:
+                print(f"[再生エラー] {e}")
+            finally:
+                if not done.done():
+                    done.set_result(generation == self._generation)
+
+
+_schedulers = {}
+
+
+def scheduler_for(guild) -> PlaybackScheduler:
+    scheduler = _schedulers.get(guild.id)
+    if scheduler is None:
+        scheduler = _schedulers[guild.id] = PlaybackScheduler(guild)
+    return scheduler
@@ -0,0 +1,73 @@
+import re
+
+# ReAct エージェントの前段に置く軽量ルーター。
+# ツールが要らないのが明らかな雑談は refiner に直接渡し、
+# Gemini の呼び出し回数とエージェントのプロンプト分のトークンを節約する。
+# あいさつ・相づちと判定できたものだけを雑談とし、それ以外はすべてエージェントに回す。
+
+ROUTE_AGENT = "agent"
+ROUTE_CHAT = "chat"
+
+MAX_CHITCHAT_LENGTH = 30
+MAX_CHITCHAT_QUESTION_LENGTH = 8  # 「元気？」のような短い問いかけだけを雑談扱いにする
+QUESTION_PATTERN = re.compile(r"[?？]\s*$")
+
+TOOL_PATTERN = re.compile(
+    "|".join([
+        r"天気|気温|雨|雪|晴れ|曇|台風|予報|傘",
+        r"予定|カレンダー|スケジュール|会議|ミーティング|約束",
+        r"タスク|todo|やること|締め?切|期限|リマインド",
+        r"検索|調べ|ググ|ニュース|最新|情報|とは|って何|ってなに|誰|どこ|いくら|値段",
+        r"為替|レート|円高|円安|ドル|ユーロ|ポンド|[A-Z]{3}\s*(→|->)",
+        r"何時|何日|何曜|日付|今日|明日|明後日|昨日|今週|来週|週末|来月|今月|何分|時間",
+        r"マスターの|プロフィール|名前|住所|趣味",
+        r"ブラウザ|サイト|ページ|https?://|www\.",
+        r"追加|削除|登録|消して|入れて|キャンセル",
+    ]),
+    re.IGNORECASE,
+)
+
+CHITCHAT_PATTERN = re.compile(
+    r"^(おはよ|こんにち|こんばん|おやすみ|ただいま|いってきま|行ってきま|ありがと|よろしく|"
+    r"ごめん|すごい|えらい|かわい|可愛|好き|大好き|疲れ|つかれ|眠い|ねむい|おつかれ|お疲れ|"
+    r"はじめまして|元気|やっほ|へー|ふーん|なるほど|うん|はい|いいね|[wｗ笑]+$)"
+)
+
+_stats = {
+    ROUTE_AGENT: {"count": 0, "elapsed": 0.0},
+    ROUTE_CHAT: {"count": 0, "elapsed": 0.0},
+}
+
+
+def route(message: str):
+    """(ROUTE_AGENT または ROUTE_CHAT, 理由) を返す"""
+    text = message.strip()
+    match = TOOL_PATTERN.search(text)
+    if match:
+        decision, reason = ROUTE_AGENT, f"ツール用キーワード「{match.group()}」"
+    elif not CHITCHAT_PATTERN.match(text):
+        decision, reason = ROUTE_AGENT, "雑談と判定できないためエージェントへ"
+    elif len(text) > MAX_CHITCHAT_LENGTH:
+        decision, reason = ROUTE_AGENT, "あいさつのあとに本題が続くためエージェントへ"
+    elif QUESTION_PATTERN.search(text) and len(text) > MAX_CHITCHAT_QUESTION_LENGTH:
+        decision, reason = ROUTE_AGENT, "質問なのでエージェントへ"
+    else:
+        decision, reason = ROUTE_CHAT, "あいさつ・相づち"
+    print(f"[ルーター] {decision}: {reason} / {text[:40]}")
+    return decision, reason
+
+
+def record(decision: str, elapsed: float):
+    """1ターンにかかった時間を記録し、経路ごとの平均と節約した LLM 呼び出し数を出力する"""
+    stats = _stats[decision]
+    stats["count"] += 1
+    stats["elapsed"] += elapsed
+
+    agent, chat = _stats[ROUTE_AGENT], _stats[ROUTE_CHAT]
+    agent_avg = agent["elapsed"] / agent["count"] if agent["count"] else 0.0
+    chat_avg = chat["elapsed"] / chat["count"] if chat["count"] else 0.0
+    print(
+        f"[ルーター] {decision} {elapsed:.2f}秒 | agent {agent['count']}回 平均{agent_avg:.2f}秒"
+        f" / chat {chat['count']}回 平均{chat_avg:.2f}秒"
+        f" | 省略したエージェント呼び出し {chat['count']}回"
+    )
@@ -0,0 +1,132 @@
+import os
+import time
+import sqlite3
+import asyncio
+from contextlib import contextmanager
+from langchain_core.messages import AIMessage, HumanMessage
+from akari_memory import AkariMemory
+
+# チャンネル（またはユーザー）ごとの会話セッションを SQLite に保存する。
+# セッションは最初のメッセージで読み込み、しばらく使われなければメモリから追い出す。
+# 会話は1ターンごとに追記するだけなので、再起動しても続きから話せる。
+
+DB_FILE = "sessions.db"
+SESSION_SCOPE = os.getenv("AKARI_SESSION_SCOPE", "channel")  # "channel" または "user"
+IDLE_EVICT_SECONDS = 30 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    key TEXT PRIMARY KEY,
+    summary TEXT NOT NULL DEFAULT '',
+    summarized_upto INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_turns_key ON turns (key, id);
+"""
+
+
+class Session:
+    def __init__(self, key: str, memory: AkariMemory):
+        self.key = key
+        self.memory = memory
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+
+class SessionStore:
+    def __init__(self, llm, path: str = DB_FILE):
+        self.llm = llm
+        self.path = path
+        self._sessions = {}
+        with self._db() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _db(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def key_for(channel, user) -> str:
+        if SESSION_SCOPE == "user":
+            return f"user:{user.id}"
+        guild = getattr(channel, "guild", None)
+        guild_id = guild.id if guild else "dm"
+        return f"{guild_id}:{channel.id}"
+
+    def get(self, key: str) -> Session:
+        self.evict_idle()
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._sessions[key] = Session(key, self._load_memory(key))
+        session.last_used = time.monotonic()
+        return session
+
+    def _load_memory(self, key: str) -> AkariMemory:
+        memory = AkariMemory(self.llm)
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT summary, summarized_upto FROM sessions WHERE key = ?", (key,)
+            ).fetchone()
+            summary, summarized_upto = row if row else ("", 0)
+            rows = conn.execute(
+                "SELECT role, content FROM turns WHERE key = ? AND id > ? ORDER BY id",
+                (key, summarized_upto),
+            ).fetchall()
+        memory.summary = summary
+        memory.recent = [
+            HumanMessage(content=content) if role == "human" else AIMessage(content=content)
+            for role, content in rows
+        ]
+        return memory
+
+    def evict_idle(self):
+        now = time.monotonic()
+        for key, session in list(self._sessions.items()):
+            if now - session.last_used > IDLE_EVICT_SECONDS and not session.lock.locked():
+                del self._sessions[key]
+
+    def add_turn(self, session: Session, user_message: str, reply: str, tool_output: str = None):
+        added = session.memory.add_turn(user_message, reply, tool_output)
+        now = time.time()
+        with self._db() as conn:
+            conn.executemany(
+                "INSERT INTO turns (key, role, content, created_at) VALUES (?, ?, ?, ?)",
+                [(session.key, m.type, m.content, now) for m in added],
+            )
+
+    async def acompact(self, session: Session):
+        """メモリが要約を更新したら、要約と要約済みの位置を保存する"""
+        if not await session.memory.acompact():
+            return
+        with self._db() as conn:
+            # 残っている直近メッセージより前の最後の行までが要約済み
+            row = conn.execute(
+                "SELECT id FROM turns WHERE key = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+                (session.key, len(session.memory.recent)),
+            ).fetchone()
+            conn.execute(
+                "INSERT INTO sessions (key, summary, summarized_upto) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET summary = excluded.summary, "
+                "summarized_upto = excluded.summarized_upto",
+                (session.key, session.memory.summary, row[0] if row else 0),
+            )
+
+    async def aclear(self, key: str):
+        """進行中のターンが書き戻さないよう、ターンが終わるのを待ってから記憶と保存した会話を消す"""
+        session = self.get(key)
+        async with session.lock:
+            session.memory.clear()
+            with self._db() as conn:
+                conn.execute("DELETE FROM turns WHERE key = ?", (key,))
+                conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
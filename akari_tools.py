@@ -1,6 +1,11 @@
 import os
-import requests
-from datetime import datetime
+import time
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from dateutil import parser as date_parser
+from akari_http import get_json, post_json, aget_json, apost_json
+from akari_cache import JsonCache, normalize_key
 from langchain.tools import Tool
 from tools.calender_read import calendar_read_tool
 from tools.calender_write import calendar_write_tool
@@ -26,83 +31,332 @@ datetime_tool = Tool(
 )
 
 # === 緯度経度取得 ===
-def get_lat_lon(city_name: str) -> str:
-    api_key = os.getenv("OPENWEATHER_API_KEY")
-    url = f"http://api.openweathermap.org/geo/1.0/direct?q={city_name}&limit=1&appid={api_key}"
-    response = requests.get(url)
-    data = response.json()
+GEOCODING_URL = "http://api.openweathermap.org/geo/1.0/direct"
+GEOCODE_CACHE_FILE = "geocode_cache.json"
+
+# よく聞かれる都市はAPIを呼ばずに答える（キーは normalize_city_name 済み）
+PRESET_CITY_COORDS = {
+    "東京": "35.6895,139.6917", "東京都": "35.6895,139.6917", "tokyo": "35.6895,139.6917",
+    "大阪": "34.6937,135.5023", "大阪市": "34.6937,135.5023", "osaka": "34.6937,135.5023",
+    "名古屋": "35.1815,136.9066", "名古屋市": "35.1815,136.9066", "nagoya": "35.1815,136.9066",
+    "札幌": "43.0618,141.3545", "札幌市": "43.0618,141.3545", "sapporo": "43.0618,141.3545",
+    "仙台": "38.2682,140.8694", "仙台市": "38.2682,140.8694", "sendai": "38.2682,140.8694",
+    "横浜": "35.4437,139.6380", "横浜市": "35.4437,139.6380", "yokohama": "35.4437,139.6380",
+    "さいたま": "35.8617,139.6455", "さいたま市": "35.8617,139.6455",
+    "千葉": "35.6074,140.1065", "千葉市": "35.6074,140.1065",
+    "新潟": "37.9162,139.0364", "新潟市": "37.9162,139.0364",
+    "金沢": "36.5613,136.6562", "金沢市": "36.5613,136.6562",
+    "静岡": "34.9756,138.3828", "静岡市": "34.9756,138.3828",
+    "京都": "35.0116,135.7681", "京都市": "35.0116,135.7681", "kyoto": "35.0116,135.7681",
+    "神戸": "34.6901,135.1955", "神戸市": "34.6901,135.1955", "kobe": "34.6901,135.1955",
+    "広島": "34.3853,132.4553", "広島市": "34.3853,132.4553", "hiroshima": "34.3853,132.4553",
+    "福岡": "33.5904,130.4017", "福岡市": "33.5904,130.4017", "fukuoka": "33.5904,130.4017",
+    "熊本": "32.8031,130.7079", "熊本市": "32.8031,130.7079",
+    "鹿児島": "31.5966,130.5571", "鹿児島市": "31.5966,130.5571",
+    "那覇": "26.2124,127.6809", "那覇市": "26.2124,127.6809", "naha": "26.2124,127.6809",
+}
+
+geocode_cache = JsonCache(GEOCODE_CACHE_FILE)
+geocode_cache.preload(PRESET_CITY_COORDS)
+
+def normalize_city_name(city_name: str) -> str:
+    return normalize_key(city_name)
+
+def _geocoding_params(city_name: str) -> dict:
+    return {"q": city_name, "limit": 1, "appid": os.getenv("OPENWEATHER_API_KEY")}
+
+def _format_lat_lon(data) -> str:
     if not data:
         return f"❌ 都市名から座標が見つかりませんでした。"
     lat, lon = data[0]["lat"], data[0]["lon"]
     return f"{lat},{lon}"
 
+def _store_lat_lon(key: str, latlon: str) -> str:
+    if not latlon.startswith("❌"):
+        geocode_cache.set(key, latlon)
+    return latlon
+
+def get_lat_lon(city_name: str) -> str:
+    key = normalize_city_name(city_name)
+    cached = geocode_cache.get(key)
+    if cached:
+        return cached
+    try:
+        data = get_json(GEOCODING_URL, params=_geocoding_params(city_name))
+        return _store_lat_lon(key, _format_lat_lon(data))
+    except Exception as e:
+        return f"❌ API呼び出し中にエラーが発生しました: {e}"
+
+async def aget_lat_lon(city_name: str) -> str:
+    key = normalize_city_name(city_name)
+    cached = geocode_cache.get(key)
+    if cached:
+        return cached
+    try:
+        data = await aget_json(GEOCODING_URL, params=_geocoding_params(city_name))
+        return _store_lat_lon(key, _format_lat_lon(data))
+    except Exception as e:
+        return f"❌ API呼び出し中にエラーが発生しました: {e}"
+
 latlon_tool = Tool(
     name="GetLatLon",
     func=get_lat_lon,
+    coroutine=aget_lat_lon,
     description="都市名を緯度経度に変換します。例: '東京' → '35.75,139.73'"
 )
 
 # === 天気予報取得 ===
+FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"
+FORECAST_UPDATE_INTERVAL = 3 * 60 * 60  # OpenWeather の予報は3時間ごとに更新される
+WEEKDAYS_SHORT = ['月', '火', '水', '木', '金', '土', '日']
+
+_forecast_cache = {}  # (lat, lon) -> (expires_at, data)
+_forecast_cache_lock = threading.Lock()
+
+def _parse_forecast_query(query: str):
+    """
+    'lat,lon' または 'lat,lon;開始~終了' を (lat, lon, window) に分解する。
+    window は現地時刻の (start, end) か None。
+    """
+    location, _, window_text = query.partition(";")
+    lat, lon = (float(v) for v in location.split(","))
+    window = None
+    if window_text.strip():
+        start_text, _, end_text = window_text.partition("~")
+        window = (date_parser.parse(start_text.strip()), date_parser.parse(end_text.strip()))
+    return round(lat, 2), round(lon, 2), window
+
+def _forecast_params(lat: float, lon: float) -> dict:
+    return {
+        "lat": lat, "lon": lon,
+        "appid": os.getenv("OPENWEATHER_API_KEY"), "units": "metric", "lang": "ja",
+    }
+
+def _cached_forecast(lat: float, lon: float):
+    with _forecast_cache_lock:
+        entry = _forecast_cache.get((lat, lon))
+    if entry and time.time() < entry[0]:
+        return entry[1]
+    return None
+
+def _store_forecast(lat: float, lon: float, data):
+    if data.get("cod") != "200":
+        return data
+    # 次の更新タイミング（3時間区切り）まで使い回す
+    now = time.time()
+    expires_at = (now // FORECAST_UPDATE_INTERVAL + 1) * FORECAST_UPDATE_INTERVAL
+    with _forecast_cache_lock:
+        _forecast_cache[(lat, lon)] = (expires_at, data)
+    return data
+
+def _local_time(entry, tz_offset: int) -> datetime:
+    return datetime.utcfromtimestamp(entry["dt"] + tz_offset)
+
+def _format_forecast_entries(entries, tz_offset: int):
+    lines = []
+    for entry in entries:
+        local = _local_time(entry, tz_offset)
+        temp = entry["main"]["temp"]
+        desc = entry["weather"][0]["description"]
+        pop = int(entry.get("pop", 0) * 100)
+        lines.append(f"{local.strftime('%m/%d %H:%M')}: {desc}, {temp:.1f}℃, 降水確率{pop}%")
+    return lines
+
+def _format_daily_summary(entries, tz_offset: int):
+    days = {}
+    for entry in entries:
+        days.setdefault(_local_time(entry, tz_offset).date(), []).append(entry)
+
+    lines = []
+    for day, items in days.items():
+        temp_max = max(e["main"].get("temp_max", e["main"]["temp"]) for e in items)
+        temp_min = min(e["main"].get("temp_min", e["main"]["temp"]) for e in items)
+        pop = int(max(e.get("pop", 0) for e in items) * 100)
+        precipitation = sum(
+            e.get("rain", {}).get("3h", 0) + e.get("snow", {}).get("3h", 0) for e in items
+        )
+        desc = Counter(e["weather"][0]["description"] for e in items).most_common(1)[0][0]
+        lines.append(
+            f"{day.strftime('%m/%d')}({WEEKDAYS_SHORT[day.weekday()]}): {desc}, "
+            f"最高{temp_max:.1f}℃/最低{temp_min:.1f}℃, 降水確率最大{pop}%, 降水量{precipitation:.1f}mm"
+        )
+    return lines
+
+def _format_forecast(data, window=None) -> str:
+    if data.get("cod") != "200":
+        return f"❌ 天気情報の取得に失敗しました: {data.get('message', 'エラー内容不明')}"
+    city = data.get("city", {}).get("name", "指定地")
+    tz_offset = data.get("city", {}).get("timezone", 0)
+
+    if window:
+        start, end = window
+        entries = [e for e in data["list"] if start <= _local_time(e, tz_offset) <= end]
+        if not entries:
+            return f"❌ {city}の指定時間帯の予報はありません（予報は5日先まで）。"
+        return f"{city}の天気予報（3時間ごと・現地時刻）:\n" + "\n".join(_format_forecast_entries(entries, tz_offset))
+
+    return f"{city}の天気予報（日別まとめ）:\n" + "\n".join(_format_daily_summary(data["list"], tz_offset))
+
 def fetch_weather_forecast(latlon: str) -> str:
-    api_key = os.getenv("OPENWEATHER_API_KEY")
     try:
-        lat, lon = latlon.split(",")
-
-        url = f"https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={api_key}&units=metric&lang=ja"
-        response = requests.get(url)
-        data = response.json()
-
-        if data.get("cod") != "200":
-            return f"❌ 天気情報の取得に失敗しました: {data.get('message', 'エラー内容不明')}"
-        city = data.get("city", {}).get("name", "指定地")
-        lines = []
-        for entry in data["list"]:
-            dt_txt = entry["dt_txt"]
-            temp = entry["main"]["temp"]
-            desc = entry["weather"][0]["description"]
-            pop = int(entry.get("pop", 0) * 100)
-            lines.append(f"{dt_txt}: {desc}, {temp:.1f}℃, 降水確率{pop}%")
-        return f"{city}の天気予報（直近）:\n" + "\n".join(lines)
+        lat, lon, window = _parse_forecast_query(latlon)
+        data = _cached_forecast(lat, lon)
+        if data is None:
+            data = _store_forecast(lat, lon, get_json(FORECAST_URL, params=_forecast_params(lat, lon)))
+        return _format_forecast(data, window)
+    except Exception as e:
+        return f"❌ API呼び出し中にエラーが発生しました: {e}"
 
+async def afetch_weather_forecast(latlon: str) -> str:
+    try:
+        lat, lon, window = _parse_forecast_query(latlon)
+        data = _cached_forecast(lat, lon)
+        if data is None:
+            data = _store_forecast(lat, lon, await aget_json(FORECAST_URL, params=_forecast_params(lat, lon)))
+        return _format_forecast(data, window)
     except Exception as e:
         return f"❌ API呼び出し中にエラーが発生しました: {e}"
 
+FORECAST_WINDOW_HELP = (
+    "時間帯を絞る場合は ';開始~終了' を付けると、その間の3時間ごとの予報を返します"
+    "（例: ';2025-05-13 09:00~2025-05-13 21:00'）。"
+)
+
 weather_forecast_tool = Tool(
     name="WeatherForecast",
     func=fetch_weather_forecast,
-    description="緯度経度（lat,lon）を受け取り5日分3時間ごとの天気予報を返します。"
+    coroutine=afetch_weather_forecast,
+    description="緯度経度（lat,lon）を受け取り5日分の天気予報を日別（最高・最低気温、降水確率、降水量）で返します。"
+    + FORECAST_WINDOW_HELP +
     "天気予報は5日分のみなのでそれより先の天気や過去の天気は検索を使ってください"
 )
 
+# === 都市名から天気予報取得 ===
+def fetch_city_weather_forecast(query: str) -> str:
+    city_name, sep, window = query.partition(";")
+    latlon = get_lat_lon(city_name.strip())
+    if latlon.startswith("❌"):
+        return latlon
+    return fetch_weather_forecast(latlon + sep + window)
+
+async def afetch_city_weather_forecast(query: str) -> str:
+    city_name, sep, window = query.partition(";")
+    latlon = await aget_lat_lon(city_name.strip())
+    if latlon.startswith("❌"):
+        return latlon
+    return await afetch_weather_forecast(latlon + sep + window)
+
+city_weather_tool = Tool(
+    name="CityWeatherForecast",
+    func=fetch_city_weather_forecast,
+    coroutine=afetch_city_weather_forecast,
+    description="都市名（例: '東京'）を受け取り、その都市の5日分の天気予報を日別で返します。"
+    + FORECAST_WINDOW_HELP +
+    "天気を聞かれたら GetLatLon と WeatherForecast を順に使う代わりにこちらを1回だけ使ってください。"
+)
+
 # === 為替レート取得 ===
+EXCHANGE_URL = "https://api.frankfurter.app/latest"
+EXCHANGE_CACHE_FILE = "exchange_rate_cache.json"
+ECB_PUBLISH_HOUR_UTC = 15        # ECB は営業日の 16:00 CET ごろにレートを公表する
+RATE_RECHECK_INTERVAL = 30 * 60  # 祝日などで公表日が進まないときの再確認間隔（秒）
+
+# 最新の EUR 基準レート表だけを "latest" に保存する。任意の通貨ペアはここからクロスレートで求める
+exchange_cache = JsonCache(EXCHANGE_CACHE_FILE)
+
+def _parse_currency_query(query: str):
+    """'USD→JPY'、'USD→JPY,EUR'、'USD,EUR→JPY' を [(base, target), ...] に分解する"""
+    query = query.replace("->", "→")
+    if "→" not in query:
+        raise ValueError("'USD→JPY' のように2通貨コードを '→' でつなげてください。")
+    left, right = query.split("→", 1)
+    bases = [c.strip().upper() for c in left.split(",") if c.strip()]
+    targets = [c.strip().upper() for c in right.split(",") if c.strip()]
+    if not bases or not targets:
+        raise ValueError("通貨コードが空です。例: 'USD→JPY,EUR'")
+    return [(base, target) for base in bases for target in targets]
+
+def _expected_publication_date() -> str:
+    now = datetime.now(timezone.utc)
+    day = now.date() if now.hour >= ECB_PUBLISH_HOUR_UTC else now.date() - timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day.isoformat()
+
+def _cached_rate_table():
+    latest = exchange_cache.get("latest")
+    if latest is None or "rates" not in latest:
+        return None
+    fresh = (
+        latest["date"] >= _expected_publication_date()
+        or time.time() - latest["checked_at"] < RATE_RECHECK_INTERVAL
+    )
+    return latest if fresh else None
+
+def _store_rate_table(data):
+    if "rates" not in data:
+        raise RuntimeError(data.get("message", "レート表を取得できませんでした"))
+    table = {
+        "date": data["date"],
+        "rates": {data.get("base", "EUR"): 1.0, **data["rates"]},
+        "checked_at": time.time(),
+    }
+    exchange_cache.set("latest", table)
+    return table
+
+def _format_exchange_rates(table, pairs) -> str:
+    rates = table["rates"]
+    lines = []
+    for base, target in pairs:
+        if base == target:
+            lines.append(f"1 {base} = 1 {target}（同じ通貨です）")
+            continue
+        if base not in rates or target not in rates:
+            lines.append(f"❌ {base}から{target}へのレートが取得できませんでした。")
+            continue
+        rate = rates[target] / rates[base]
+        rate_str = f"{rate:.3f}" if rate >= 1 else f"{rate:.6f}"
+        lines.append(f"【{table['date']}】1 {base} = {rate_str} {target}")
+    return "\n".join(lines)
+
 def get_exchange_rate(query: str) -> str:
     try:
-        if "→" not in query:
-            return "❌ 'USD→JPY' のように2通貨コードを '→' でつなげてください。"
-        base, target = map(str.strip, query.split("→"))
-        url = f"https://api.frankfurter.app/latest?from={base}&to={target}"
-        response = requests.get(url)
-        data = response.json()
-        if "rates" not in data or target not in data["rates"]:
-            return f"❌ {base}から{target}へのレートが取得できませんでした。"
-        rate = data["rates"][target]
-        return f"【{data['date']}】1 {base} = {rate:.3f} {target}"
+        pairs = _parse_currency_query(query)
+        table = _cached_rate_table() or _store_rate_table(get_json(EXCHANGE_URL))
+        return _format_exchange_rates(table, pairs)
+    except ValueError as e:
+        return f"❌ {e}"
+    except Exception as e:
+        return f"❌ 為替API呼び出しエラー: {e}"
+
+async def aget_exchange_rate(query: str) -> str:
+    try:
+        pairs = _parse_currency_query(query)
+        table = _cached_rate_table() or _store_rate_table(await aget_json(EXCHANGE_URL))
+        return _format_exchange_rates(table, pairs)
+    except ValueError as e:
+        return f"❌ {e}"
     except Exception as e:
         return f"❌ 為替API呼び出しエラー: {e}"
 
 exchange_rate_tool = Tool(
     name="GetExchangeRate",
     func=get_exchange_rate,
+    coroutine=aget_exchange_rate,
     description="為替レートを取得します。形式: 'USD→JPY'"
+    "複数の通貨は1回でまとめて取得してください（例: 'USD,EUR,GBP→JPY' や 'JPY→USD,EUR'）。"
     "返答には変換レートと日付が含まれます。"
 )
 
 # === Web検索 ===
-def web_search_tool_func(query: str) -> str:
-    api_key = os.getenv("PERPLEXITY_API_KEY")
-    if not api_key:
-        return "❌ Perplexity APIキーが設定されていません"
+PERPLEXITY_URL = "https://api.perplexity.ai/chat/completions"
+SEARCH_CACHE_FILE = "search_cache.json"
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", 6 * 60 * 60))  # 秒
+
+# 正規化したクエリ -> {"content", "citations"}
+search_cache = JsonCache(SEARCH_CACHE_FILE, ttl=SEARCH_CACHE_TTL)
 
+def _search_request(query: str, api_key: str):
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
@@ -126,19 +380,59 @@ def web_search_tool_func(query: str) -> str:
         "top_k": 3,
         "stream": False
     }
+    return payload, headers
+
+def _format_search_result(result) -> str:
+    content = result["content"]
+    citations = result.get("citations", [])
+    urls = "\n".join([f"🔗 {url}" for url in citations])
+    return f"{content}\n\n{urls}" if citations else content
+
+def _cached_search(key: str):
+    result = search_cache.get(key)
+    print(f"[検索キャッシュ] {'hit' if result else 'miss'}: {key} ({search_cache.stats()})")
+    return result
+
+def _store_search(key: str, response_data):
+    result = {
+        "content": response_data['choices'][0]['message']['content'],
+        "citations": response_data.get("citations", []),
+    }
+    search_cache.set(key, result)
+    return result
+
+def web_search_tool_func(query: str) -> str:
+    api_key = os.getenv("PERPLEXITY_API_KEY")
+    if not api_key:
+        return "❌ Perplexity APIキーが設定されていません"
+    try:
+        key = normalize_key(query)
+        result = _cached_search(key)
+        if result is None:
+            payload, headers = _search_request(query, api_key)
+            result = _store_search(key, post_json(PERPLEXITY_URL, payload, headers=headers))
+        return _format_search_result(result)
+    except Exception as e:
+        return f"❌ Perplexity APIエラー: {e}"
+
+async def aweb_search_tool_func(query: str) -> str:
+    api_key = os.getenv("PERPLEXITY_API_KEY")
+    if not api_key:
+        return "❌ Perplexity APIキーが設定されていません"
     try:
-        response = requests.post("https://api.perplexity.ai/chat/completions", json=payload, headers=headers)
-        response_data = response.json()
-        content = response_data['choices'][0]['message']['content']
-        citations = response_data.get("citations", [])
-        urls = "\n".join([f"🔗 {url}" for url in citations])
-        return f"{content}\n\n{urls}" if citations else content
+        key = normalize_key(query)
+        result = _cached_search(key)
+        if result is None:
+            payload, headers = _search_request(query, api_key)
+            result = _store_search(key, await apost_json(PERPLEXITY_URL, payload, headers=headers))
+        return _format_search_result(result)
     except Exception as e:
         return f"❌ Perplexity APIエラー: {e}"
 
 search_tool = Tool(
     name="WebSearch",
     func=web_search_tool_func,
+    coroutine=aweb_search_tool_func,
     description="Perplexityを使って、ニュースや政治などの**事実ベースの最新情報**を検索するためのツールです。\n"
         "**天気、日付、時刻、感情や主観的な話題、個人的な会話には使わないでください。**\n"
         "**検索は1つの話題につき1回までにしてください。特に事実確認の再検索は禁止です。**\n"
@@ -168,6 +462,7 @@ tools = [
     search_tool,
     browser_agent_tool,
     datetime_tool,
+    city_weather_tool,
     latlon_tool,
     weather_forecast_tool,
     exchange_rate_tool,
@@ -0,0 +1,201 @@
+import os
+import io
+import math
+import wave
+import array
+import asyncio
+import hashlib
+import tempfile
+import threading
+import unicodedata
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import seikasay2
+
+# 音声合成ワーカー。
+# 合成ジョブをキューで受け取り、専用スレッドでバックエンドの render() を順番に実行する。
+# イベントループは合成中も止まらず、WAVのバイト列を Future で受け取れる。
+#
+# バックエンド:
+#   - SeikaSayBackend: SeikaSay2 + A.I.VOICE（Windows）
+#   - ToneBackend:     SeikaSay2 のない環境向けの代替。文字数に応じた長さのトーンを返す
+# CachedBackend で包むと、同じ文・話速・声の組み合わせはディスク上のWAVを返す。
+
+TTS_BACKEND = os.getenv("AKARI_TTS_BACKEND", "seika")  # "seika" または "tone"
+TTS_CACHE_ENABLED = os.getenv("AKARI_TTS_CACHE", "1") == "1"
+TTS_CACHE_DIR = "tts_cache"
+TTS_CACHE_MAX_BYTES = int(os.getenv("AKARI_TTS_CACHE_MAX_MB", 200)) * 1024 * 1024
+
+
+class TTSBackend(ABC):
+    """合成バックエンドの共通インターフェース"""
+    voice_id = ""
+
+    @abstractmethod
+    def render(self, text: str, speed: float) -> bytes:
+        ...
+
+    def lookup(self, text: str, speed: float):
+        """合成せずに返せる音声があれば返す（キャッシュ用）"""
+        return None
+
+
+class SeikaSayBackend(TTSBackend):
+    def __init__(self, cid: int = seikasay2.DEFAULT_CID):
+        self.cid = cid
+        self.voice_id = f"seika:{cid}"
+
+    def render(self, text: str, speed: float) -> bytes:
+        # 出力は発話ごとの一時ファイルに書き出してすぐ読み戻す
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            seikasay2.say(text, speed, path, cid=self.cid)
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+
+class ToneBackend(TTSBackend):
+    voice_id = "tone"
+    SAMPLE_RATE = 22050
+    SECONDS_PER_CHAR = 0.12
+
+    def render(self, text: str, speed: float) -> bytes:
+        n_samples = int(self.SAMPLE_RATE * self.SECONDS_PER_CHAR * max(len(text), 1) / speed)
+        samples = array.array("h", (
+            int(3000 * math.sin(2 * math.pi * 440 * i / self.SAMPLE_RATE)) for i in range(n_samples)
+        ))
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.SAMPLE_RATE)
+            wav.writeframes(samples.tobytes())
+        return buffer.getvalue()
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).replace("\n", "、")
+    return " ".join(text.split())
+
+
+class CachedBackend(TTSBackend):
+    """(正規化したテキスト, 話速, 声) をキーに合成結果をディスクに保存し、容量を超えたら古い順に消す"""
+
+    def __init__(self, backend: TTSBackend, cache_dir: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES):
+        self.backend = backend
+        self.voice_id = backend.voice_id
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, text: str, speed: float) -> str:
+        key = f"{normalize_text(text)}|{speed:.2f}|{self.voice_id}"
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".wav")
+
+    def lookup(self, text: str, speed: float):
+        path = self._path(text, speed)
+        with self._lock:
+            try:
+                with open(path, "rb") as f:
+                    audio = f.read()
+            except FileNotFoundError:
+                return None
+            os.utime(path)  # LRU: 使ったものを新しくする
+            self.hits += 1
+        print(f"[TTSキャッシュ] hit: {text[:20]} (hit={self.hits}, miss={self.misses})")
+        return audio
+
+    def render(self, text: str, speed: float) -> bytes:
+        audio = self.lookup(text, speed)
+        if audio is not None:
+            return audio
+        audio = self.backend.render(text, speed)
+        path = self._path(text, speed)
+        with self._lock:
+            self.misses += 1
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+            self._evict()
+        return audio
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".wav"):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+
+def create_backend(name: str = TTS_BACKEND, cache: bool = TTS_CACHE_ENABLED) -> TTSBackend:
+    backend = ToneBackend() if name == "tone" else SeikaSayBackend()
+    return CachedBackend(backend) if cache else backend
+
+
+class TTSWorker:
+    def __init__(self, backend: TTSBackend):
+        self.backend = backend
+        self._queue = None
+        self._task = None
+        # A.I.VOICE は同時に1つしか合成できないので1スレッドで直列に処理する
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts")
+        # キャッシュの読み込みはディスクを読むので、合成とは別のスレッドで行う
+        self._lookup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-cache")
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def submit(self, text: str, speed: float = seikasay2.DEFAULT_SPEED) -> asyncio.Future:
+        """合成ジョブを登録し、WAVのバイト列を返す Future を返す"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._ensure_started()
+        # キャッシュにあれば合成待ちの列に並ばずに返す（確認はイベントループの外で行う）
+        lookup = loop.run_in_executor(self._lookup_executor, self.backend.lookup, text, speed)
+        lookup.add_done_callback(lambda done: self._on_lookup(done, text, speed, future))
+        return future
+
+    def _on_lookup(self, lookup: asyncio.Future, text: str, speed: float, future: asyncio.Future):
+        if future.done():
+            return
+        cached = None if lookup.exception() else lookup.result()
+        if cached is not None:
+            future.set_result(cached)
+        else:
+            self._queue.put_nowait((text, speed, future))
+
+    async def synthesize(self, text: str, speed: float = seikasay2.DEFAULT_SPEED) -> bytes:
+        return await self.submit(text, speed)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            text, speed, future = await self._queue.get()
+            if future.cancelled():
+                continue
+            try:
+                audio = await loop.run_in_executor(self._executor, self.backend.render, text, speed)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            if not future.done():
+                future.set_result(audio)
+
+
+tts_worker = TTSWorker(create_backend())
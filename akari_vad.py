@@ -0,0 +1,85 @@
+import os
+import collections
+import webrtcvad
+
+# webrtcvad による発話区間の切り出し。
+# フレームを1つずつ push() すると、区切れた発話区間を (音声, 確定か, 開始位置の秒数) のリストで返す。
+# マイクの音声（live_transcribe.py）と Discord の話者ごとの音声（voice_ingest.py）で共通に使う。
+
+SAMPLE_RATE = 16000
+FRAME_DURATION = 30  # ms
+FRAME_SIZE = int(SAMPLE_RATE * FRAME_DURATION / 1000)
+FRAME_BYTES = FRAME_SIZE * 2  # 16bit モノラル
+BUFFER_DURATION = 8  # 秒上限
+SILENCE_TIMEOUT = 1  # 無音と判定する時間（秒）
+VAD_MODE = 2  # 感度（0:保守的, 3:積極的）
+STREAMING = os.getenv("AKARI_TRANSCRIBE_STREAM", "1") == "1"  # 話している途中の仮の認識結果も出す
+PARTIAL_STRIDE = float(os.getenv("AKARI_PARTIAL_STRIDE", 1.0))  # 途中結果を認識し直す間隔（秒）
+
+
+class VadSegmenter:
+    """
+    1つの音声ストリームを発話区間に区切る。
+    partial_stride を指定すると、発話中もその間隔でそこまでの音声を確定前の結果として返す。
+    """
+
+    def __init__(self, partial_stride: float = None, mode: int = VAD_MODE):
+        self.vad = webrtcvad.Vad(mode)
+        self.ring_buffer = collections.deque(maxlen=int(SILENCE_TIMEOUT * 1000 / FRAME_DURATION))
+        self.max_frames = int(BUFFER_DURATION * 1000 / FRAME_DURATION)
+        self.stride_frames = int(partial_stride * 1000 / FRAME_DURATION) if partial_stride else 0
+        self.position = 0       # これまでに受け取ったフレーム数
+        self.segment_start = 0  # 話している区間の先頭フレーム
+        self.reset()
+
+    def reset(self):
+        """話している途中の音声を捨てる"""
+        self.voiced_frames = []
+        self.triggered = False
+        self.ring_buffer.clear()
+        self.frames_since_start = 0
+        self.frames_since_partial = 0
+
+    def _segment(self, final: bool):
+        return b''.join(self.voiced_frames), final, self.segment_start * FRAME_DURATION / 1000
+
+    def push(self, frame: bytes) -> list:
+        events = []
+        is_speech = self.vad.is_speech(frame, SAMPLE_RATE)
+        self.frames_since_start += 1
+        self.position += 1
+
+        if not self.triggered:
+            self.ring_buffer.append((frame, is_speech))
+            num_voiced = len([f for f, speech in self.ring_buffer if speech])
+            if num_voiced > 0.9 * self.ring_buffer.maxlen:
+                self.triggered = True
+                self.voiced_frames.extend(f for f, s in self.ring_buffer)
+                self.segment_start = self.position - len(self.ring_buffer)
+                self.ring_buffer.clear()
+                self.frames_since_partial = 0
+        else:
+            self.voiced_frames.append(frame)
+            self.ring_buffer.append((frame, is_speech))
+            num_unvoiced = len([f for f, speech in self.ring_buffer if not speech])
+            if num_unvoiced > 0.8 * self.ring_buffer.maxlen:
+                events.append(self._segment(True))
+                self.reset()
+            elif self.stride_frames:
+                self.frames_since_partial += 1
+                if self.frames_since_partial >= self.stride_frames:
+                    self.frames_since_partial = 0
+                    events.append(self._segment(False))
+
+        # 時刻ではなくフレーム数で数えるので、待ち行列に溜まったフレームでも区間長が狂わない
+        if self.frames_since_start > self.max_frames:
+            if self.voiced_frames:
+                events.append(self._segment(True))
+            self.reset()
+        return events
+
+    def flush(self) -> list:
+        """入力が終わったときに話している途中だった分も確定結果として返す"""
+        events = [self._segment(True)] if self.triggered and self.voiced_frames else []
+        self.reset()
+        return events
@@ -0,0 +1,126 @@
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+import statistics
+import live_transcribe
+from akari_cache import normalize_key
+
+# 文字起こしのオフラインベンチマーク。
+# クリップのディレクトリにある *.wav（16kHz・モノラル・16bit）と同名の *.txt（正解テキスト）を対にし、
+# vad_collector() で区切った発話ごとにモデルで認識して、次の値をクリップごとと全体で表示する。
+#   - 発話の終端を検出してから文字が出るまでの時間（latency）
+#   - 実時間比（RTF = 認識時間 / 音声の長さ）
+#   - 文字誤り率（CER。表記ゆれ・空白・句読点は無視する）
+#   - 区切られた発話区間の数
+#
+#   python bench_transcribe.py clips/ --model small --device cpu --output small-cpu.json
+
+
+def edit_distance(ref: str, hyp: str) -> int:
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i]
+        for j, h in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h)))
+        previous = current
+    return previous[-1]
+
+
+def run_clip(wav_path: str, reference: str) -> dict:
+    latencies = []
+    texts = []
+    processing = 0.0
+    for segment, _, _ in live_transcribe.vad_collector(live_transcribe.read_frames(wav_path)):
+        endpoint = time.perf_counter()
+        texts.append(live_transcribe.transcribe(segment)["text"])
+        latency = time.perf_counter() - endpoint
+        latencies.append(latency)
+        processing += latency
+
+    n_frames = sum(1 for _ in live_transcribe.read_frames(wav_path))
+    audio_seconds = n_frames * live_transcribe.FRAME_DURATION / 1000
+    ref = normalize_key(reference)
+    hyp = normalize_key("".join(texts))
+    errors = edit_distance(ref, hyp)
+    return {
+        "clip": os.path.basename(wav_path),
+        "segments": len(latencies),
+        "audio_seconds": audio_seconds,
+        "processing_seconds": processing,
+        "rtf": processing / audio_seconds if audio_seconds else 0.0,
+        "latencies": latencies,
+        "errors": errors,
+        "ref_chars": len(ref),
+        "cer": errors / len(ref) if ref else 0.0,
+        "hypothesis": "".join(texts),
+    }
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ラベル付きの音声クリップで文字起こしの遅延・速度・精度を測る")
+    parser.add_argument("clips", help="*.wav と同名の *.txt を置いたディレクトリ")
+    parser.add_argument("--output", help="結果を JSON で保存するパス（リリース間の比較用）")
+    live_transcribe.add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    live_transcribe.load_model(args)
+
+    results = []
+    for wav_path in sorted(glob.glob(os.path.join(args.clips, "*.wav"))):
+        label_path = os.path.splitext(wav_path)[0] + ".txt"
+        if not os.path.exists(label_path):
+            print(f"[skip] 正解テキストがありません: {wav_path}", file=sys.stderr)
+            continue
+        with open(label_path, encoding="utf-8") as f:
+            reference = f.read().strip()
+        result = run_clip(wav_path, reference)
+        results.append(result)
+        print(
+            f"{result['clip']}: segments={result['segments']} audio={result['audio_seconds']:.1f}s "
+            f"latency(avg/max)={statistics.mean(result['latencies'] or [0]):.2f}/{max(result['latencies'] or [0]):.2f}s "
+            f"rtf={result['rtf']:.2f} cer={result['cer']:.3f}"
+        )
+
+    if not results:
+        print("ベンチマークできるクリップがありませんでした。")
+        return
+
+    latencies = [latency for r in results for latency in r["latencies"]]
+    audio_seconds = sum(r["audio_seconds"] for r in results)
+    ref_chars = sum(r["ref_chars"] for r in results)
+    summary = {
+        "profile": {
+            "model": args.model, "device": args.device, "compute_type": args.compute_type,
+            "cpu_threads": args.cpu_threads, "num_workers": args.num_workers, "beam_size": args.beam_size,
+        },
+        "clips": len(results),
+        "segments": sum(r["segments"] for r in results),
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p90": percentile(latencies, 0.9),
+        "latency_max": max(latencies, default=0.0),
+        "rtf": sum(r["processing_seconds"] for r in results) / audio_seconds if audio_seconds else 0.0,
+        "cer": sum(r["errors"] for r in results) / ref_chars if ref_chars else 0.0,
+    }
+    print(
+        f"\n合計: clips={summary['clips']} segments={summary['segments']} "
+        f"latency(p50/p90/max)={summary['latency_p50']:.2f}/{summary['latency_p90']:.2f}/{summary['latency_max']:.2f}s "
+        f"rtf={summary['rtf']:.2f} cer={summary['cer']:.3f}"
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,66 @@
 import discord
 from discord.ext import commands
-from discord import FFmpegPCMAudio
 import os
 import asyncio
 from dotenv import load_dotenv
-import subprocess
 import sys
+import re
+import time
 import shlex
+import json
+import base64
+import functools
 
-from akari_agent import agent_executor, memory, SearchAnnounceHandler, refiner
+from akari_agent import agent_executor, sessions, SearchAnnounceHandler, refiner
+import akari_router
+import akari_http
+from akari_tts import tts_worker
+from akari_playback import scheduler_for
 
 # Constants
-OUTPUT_WAV = "output.wav"
-CHECK_INTERVAL = 0.2
+SENTENCE_PATTERN = re.compile(r"[^。！？!?\n]*[。！？!?\n]+")
 
 # Environment Setup
 load_dotenv()
 DISCORD_TOKEN = os.environ.get("DISCORD_TOKEN")
+STREAM_REPLY = os.environ.get("AKARI_STREAM_REPLY", "1") == "1"
+COALESCE_WINDOW = float(os.environ.get("AKARI_COALESCE_WINDOW", 1.5))  # 確定結果をまとめて待つ時間（秒）
+VOICE_INPUT = os.environ.get("AKARI_VOICE_INPUT", "mic")  # "mic"（サーバーのマイク）または "discord"（VCで受信した音声）
 
 # Globals
-latest_mtime = 0
-transcribe_proc = None
+transcribe_proc = None      # モデルを読み込んだまま動き続ける live_transcribe.py
+transcribe_channel = None   # 文字起こしの結果を送るチャンネル
+transcribe_user = None      # 通話モードを始めたユーザー（マイクの話し手として扱う）
+transcriber_ready = False
+listening = False
 
 # Bot Setup
+class AkariBot(commands.Bot):
+    async def close(self):
+        # ツールが使い回している aiohttp のセッションもイベントループと一緒に閉じる
+        await akari_http.aclose()
+        await super().close()
+
+
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix='!', intents=intents)
+bot = AkariBot(command_prefix='!', intents=intents)
 
 
 @bot.event
 async def on_ready():
     print(f'Logged in as {bot.user}')
-    bot.loop.create_task(monitor_wav_changes())
 
 
 @bot.command()
 async def join(ctx):
     if ctx.author.voice:
-        await ctx.author.voice.channel.connect()
+        cls = discord.VoiceClient
+        if VOICE_INPUT == "discord":
+            # VCの音声を受信するときだけ、受信に対応したクライアントで接続する
+            from discord.ext import voice_recv
+            cls = voice_recv.VoiceRecvClient
+        await ctx.author.voice.channel.connect(cls=cls)
         await ctx.send(f"🔊 あかりが `{ctx.author.voice.channel.name}` にログインしたよ！")
     else:
         await ctx.send("VCに入ってからコマンドを実行してね。")
@@ -46,14 +69,15 @@ async def join(ctx):
 @bot.command()
 async def leave(ctx):
     if ctx.voice_client:
+        scheduler_for(ctx.guild).barge_in()
         await ctx.voice_client.disconnect()
 
 
 @bot.command()
-async def play(ctx, filename: str = OUTPUT_WAV):
+async def play(ctx, filename: str):
     if ctx.voice_client:
-        source = FFmpegPCMAudio(filename)
-        ctx.voice_client.play(source)
+        with open(filename, "rb") as f:
+            scheduler_for(ctx.guild).enqueue(f.read())
     else:
         await ctx.send("VCに入ってないよ。まず `!join` してね。")
 
@@ -90,139 +114,351 @@ async def say(ctx, *, args: str):
             await ctx.send("⚠️ 読み上げるテキストがないよ！")
             return
 
-        subprocess.run([
-            sys.executable, "seikasay2.py", "-s", str(speed), "--", *text_parts
-        ], check=True)
-
-        vc = ctx.voice_client
-        if not vc.is_playing():
-            vc.play(FFmpegPCMAudio(OUTPUT_WAV))
-        else:
-            await ctx.send("⚠️ 現在再生中です。")
+        audio = await tts_worker.synthesize(" ".join(text_parts), speed)
+        # 再生中でも捨てずに順番待ちに積む
+        scheduler_for(ctx.guild).enqueue(audio)
     except Exception as e:
         await ctx.send(f"❌ エラーが発生しました：{e}")
 
 
+def split_sentences(text: str):
+    """文末（。！？と改行）で区切り、(完成した文のリスト, 残り) を返す"""
+    sentences = []
+    end = 0
+    for match in SENTENCE_PATTERN.finditer(text):
+        sentences.append(match.group())
+        end = match.end()
+    return sentences, text[end:]
+
+
+def voice_client_for(channel):
+    guild = getattr(channel, "guild", None)
+    return guild.voice_client if guild else None
+
+
+def playback_generation(channel):
+    """ターン開始時の再生の generation（VCにいなければ None）"""
+    return scheduler_for(channel.guild).generation if voice_client_for(channel) else None
+
+
+def interrupted(channel, generation) -> bool:
+    return generation is not None and scheduler_for(channel.guild).generation != generation
+
+
+async def stream_reply(channel, refiner_input: dict, generation: int = None) -> str:
+    """
+    refiner の出力をストリーミングで受け取り、文ごとに
+    Discord へのメッセージ更新と音声合成を進める。
+    途中で話しかけられたら（barge_in）生成を打ち切る。
+    """
+    def speak(sentence: str):
+        # 合成の完了を待たずに Future のまま再生待ちに積む
+        if voice_client_for(channel) and sentence.strip():
+            scheduler_for(channel.guild).enqueue(tts_worker.submit(sentence.strip()), generation=generation)
+
+    reply = ""
+    pending = ""
+    message = None
+    async for chunk in refiner.astream(refiner_input):
+        if interrupted(channel, generation):
+            pending = ""
+            break
+        pending += chunk.content
+        sentences, pending = split_sentences(pending)
+        if not sentences:
+            continue
+        for sentence in sentences:
+            speak(sentence)
+        reply += "".join(sentences)
+        if message is None:
+            message = await channel.send(f"💬 あかり: {reply}")
+        else:
+            await message.edit(content=f"💬 あかり: {reply}")
+
+    speak(pending)
+    reply = (reply + pending).strip()
+    if message is None:
+        await channel.send(f"💬 あかり: {reply}")
+    else:
+        await message.edit(content=f"💬 あかり: {reply}")
+    return reply
+
+
 @bot.command()
 async def chat(ctx, *, message: str):
+    await chat_in_channel(ctx.channel, ctx.author, message)
+
+
+async def chat_in_channel(channel, user, message: str):
+    """コマンドからも音声認識からも、この経路で1ターン分の会話を行う"""
+    session = sessions.get(sessions.key_for(channel, user))
+    async with session.lock:
+        await run_chat_turn(channel, session, message)
+
+
+async def run_chat_turn(channel, session, message: str):
+    memory = session.memory
+    # 割り込まれたあとにこのターンの音声が再生されないよう、開始時の generation を控える
+    generation = playback_generation(channel)
     try:
-        callback = SearchAnnounceHandler(ctx)
-
-        history_text = "\n".join([
-            f"マスター: {m.content}" if m.type == "human" else f"あかり: {m.content}"
-            for m in memory.chat_memory.messages
-        ])
-        full_input = f"{history_text}\nマスター: {message}"
-        result = await agent_executor.ainvoke(
-            {"input": full_input},
-            config={"callbacks": [callback]}
-        )
+        started = time.perf_counter()
+        decision, _ = akari_router.route(message)
 
-        tool_output = result["output"]
-        intermediate = result.get("intermediate_steps", [])
-        used_tool = bool(intermediate)
+        tool_output = None
+        used_tool = False
+        if decision == akari_router.ROUTE_AGENT:
+            callback = SearchAnnounceHandler(channel, generation)
+
+            full_input = f"{memory.history_text()}\nマスター: {message}"
+            result = await agent_executor.ainvoke(
+                {"input": full_input},
+                config={"callbacks": [callback]}
+            )
+
+            tool_output = result["output"]
+            intermediate = result.get("intermediate_steps", [])
+            used_tool = bool(intermediate)
 
         if used_tool:
-            refined = await refiner.ainvoke({
+            refiner_input = {
                 "input": (
                     f"マスター: {message}"
                     f"ツールの結果: {tool_output}\n"
                     "あかりらしい文章でこの結果をマスターに伝えてね"
                 ),
-                "chat_history": memory.chat_memory.messages
-            })
-            reply = refined.content
-
+                "chat_history": memory.messages,
+                "summary": memory.summary_text(),
+            }
         else:
-            refined = await refiner.ainvoke({
+            refiner_input = {
                 "input": (
                     f"マスター: {message}\n"
                 ),
-                "chat_history": memory.chat_memory.messages
-            })
+                "chat_history": memory.messages,
+                "summary": memory.summary_text(),
+            }
+
+        if STREAM_REPLY:
+            reply = await stream_reply(channel, refiner_input, generation)
+        else:
+            refined = await refiner.ainvoke(refiner_input)
             reply = refined.content
-            
-        memory.chat_memory.add_user_message(message)
-        if used_tool:
-            memory.chat_memory.add_ai_message(f"[toolの結果]: {tool_output}")
-        memory.chat_memory.add_ai_message(reply)
 
-        await ctx.send(f"💬 あかり: {reply}")
+        sessions.add_turn(session, message, reply, tool_output if used_tool else None)
+        akari_router.record(decision, time.perf_counter() - started)
+
+        if not STREAM_REPLY:
+            await channel.send(f"💬 あかり: {reply}")
 
-        subprocess.run([sys.executable, "seikasay2.py", "--", reply], check=True)
-        vc = ctx.voice_client
-        if vc and not vc.is_playing():
-            vc.play(FFmpegPCMAudio(OUTPUT_WAV))
+            if voice_client_for(channel):
+                scheduler_for(channel.guild).enqueue(tts_worker.submit(reply), generation=generation)
+
+        # 返答を届けてから古い会話を要約に畳み込む
+        await sessions.acompact(session)
     except Exception as e:
-        await ctx.send(f"❌ エージェントエラー：{e}")
+        await channel.send(f"❌ エージェントエラー：{e}")
 
 
 @bot.command()
 async def forget(ctx):
-    memory.clear()
+    await sessions.aclear(sessions.key_for(ctx.channel, ctx.author))
     await ctx.send("🧠 あかりちゃんの記憶をリセットしたよ。")
 
 
+class TranscriptCoalescer:
+    """
+    短い待ち時間のうちに届いた確定結果を1つの発話にまとめて渡す。
+    確定結果や途中結果（まだ話している）が届くたびに待ち時間を延ばす。
+    """
+
+    def __init__(self, window: float, dispatch):
+        self.window = window
+        self.dispatch = dispatch
+        self._texts = []
+        self._timer = None
+
+    def add(self, text: str):
+        self._texts.append(text)
+        self._restart()
+
+    def extend(self):
+        if self._texts:
+            self._restart()
+
+    def clear(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        self._texts = []
+
+    def _restart(self):
+        if self._timer:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+
+    def _flush(self):
+        text = "".join(self._texts)
+        self._texts = []
+        self._timer = None
+        asyncio.get_running_loop().create_task(self.dispatch(text))
+
+
+async def dispatch_transcript(speaker, text: str):
+    """まとめた発話を、メッセージを取得し直さずにそのまま会話に渡す"""
+    channel = transcribe_channel
+    user, name = transcribe_user, "マスター"
+    try:
+        if speaker is not None:
+            member = channel.guild.get_member(int(speaker))
+            if member:
+                user, name = member, member.display_name
+        await channel.send(f"{name}: {text}")
+        await chat_in_channel(channel, user, text)
+    except Exception as e:
+        print(f"[dispatch_transcript エラー] {e}")
+
+
+transcripts = {}  # 話者（マイクの音声は None）ごとの TranscriptCoalescer
+
+
+def transcripts_for(speaker) -> TranscriptCoalescer:
+    coalescer = transcripts.get(speaker)
+    if coalescer is None:
+        coalescer = transcripts[speaker] = TranscriptCoalescer(
+            COALESCE_WINDOW, functools.partial(dispatch_transcript, speaker)
+        )
+    return coalescer
+
+
+def start_voice_receive(voice_client):
+    """VCで受信した音声を話者ごとに区切り、文字起こしサービスに送る"""
+    from voice_ingest import create_ingest, create_sink
+    loop = asyncio.get_running_loop()
+
+    def on_segment(user_id, audio, final, start):
+        # 受信スレッドから呼ばれるのでイベントループに渡す
+        asyncio.run_coroutine_threadsafe(send_voice_segment(user_id, audio, final, start), loop)
+
+    ingest = create_ingest(on_segment)
+    ingest.start()
+    voice_client.listen(create_sink(ingest))
+
+
+async def send_voice_segment(user_id, audio: bytes, final: bool, start: float):
+    # モデルの準備ができる前の音声はパイプに溜めずに捨てる
+    if not (listening and transcriber_ready and transcribe_proc):
+        return
+    await send_transcriber_command(json.dumps({
+        "cmd": "segment",
+        "speaker": str(user_id) if user_id else None,
+        "pcm": base64.b64encode(audio).decode("ascii"),
+        "final": final,
+        "start": round(start, 2),
+    }))
+
+
 @bot.command()
 async def listen(ctx):
-    global transcribe_proc
-    if transcribe_proc is not None:
+    global transcribe_proc, transcribe_channel, transcribe_user, listening
+    if listening:
         await ctx.send("⚠️ すでに通話中です。")
         return
+    if VOICE_INPUT == "discord" and not hasattr(ctx.voice_client, "listen"):
+        # voice_recv.VoiceRecvClient で接続していなければ受信できない
+        await ctx.send("まず `!join` でVCに入ってね。")
+        return
+
+    transcribe_channel = ctx.channel
+    transcribe_user = ctx.author
+    listening = True
+    if VOICE_INPUT == "discord":
+        start_voice_receive(ctx.voice_client)
+    if transcribe_proc is not None and transcribe_proc.returncode is None:
+        # モデルは読み込んだままなので、録音を再開するだけですぐ始まる
+        await send_transcriber_command("resume")
+        await ctx.send("🎤 通話モードを再開しました。話しかけてみてね。")
+        return
 
     await ctx.send("🎤 通話モードを開始します… お待ちください")
     transcribe_proc = await asyncio.create_subprocess_exec(
-        sys.executable, "live_transcribe.py", stdout=asyncio.subprocess.PIPE
+        sys.executable, "live_transcribe.py", *(["--input", "none"] if VOICE_INPUT == "discord" else []),
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE
     )
-    bot.loop.create_task(read_transcriptions(transcribe_proc.stdout, ctx.channel))
+    bot.loop.create_task(read_transcriptions(transcribe_proc))
+
 
+async def send_transcriber_command(command: str):
+    transcribe_proc.stdin.write(f"{command}\n".encode("utf-8"))
+    await transcribe_proc.stdin.drain()
 
-async def read_transcriptions(stdout, channel):
+
+async def read_transcriptions(proc):
+    global transcribe_proc, transcriber_ready, listening
     while True:
-        line = await stdout.readline()
+        line = await proc.stdout.readline()
         if not line:
             break
         try:
-            text = line.decode("utf-8", errors="ignore").strip()
-            if "ERROR" in text.upper():
-                await channel.send(f"⚠️ 音声認識でエラーが発生しました: `{text}`")
-                continue
-            if text == "READY":
-                await channel.send("✅ モデルの初期化が完了しました！話しかけてみてね。")
-                continue
-            if text:
-                ctx = await bot.get_context(await channel.fetch_message(channel.last_message_id))
-                await ctx.send(f"マスター: {text}")
-                await chat(ctx, message=text)
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            print(f"[音声認識] {line.decode('utf-8', errors='ignore').strip()}")
+            continue
+        try:
+            await handle_transcription_event(event)
         except Exception as e:
             print(f"[read_transcriptions エラー] {e}")
 
-
-async def monitor_wav_changes():
-    global latest_mtime
-    print("[監視] output.wav の変更を監視中")
-    while True:
-        try:
-            if os.path.exists(OUTPUT_WAV):
-                mtime = os.path.getmtime(OUTPUT_WAV)
-                if mtime != latest_mtime:
-                    latest_mtime = mtime
-                    print("[検知] WAVファイルが更新されました")
-                    vc = discord.utils.get(bot.voice_clients)
-                    if vc and not vc.is_playing():
-                        print("[再生] output.wav の更新を検知、再生します")
-                        vc.play(FFmpegPCMAudio(OUTPUT_WAV))
-        except Exception as e:
-            print(f"[エラー] {e}")
-        await asyncio.sleep(CHECK_INTERVAL)
+    if transcribe_proc is proc:
+        transcribe_proc = None
+        transcriber_ready = False
+        if listening:
+            listening = False
+            await transcribe_channel.send("⚠️ 音声認識が終了しました。もう一度 `!listen` してね。")
+
+
+async def handle_transcription_event(event: dict):
+    global transcriber_ready
+    channel = transcribe_channel
+    kind = event.get("event")
+    speaker = event.get("speaker")
+    if kind == "ready":
+        transcriber_ready = True
+        await channel.send("✅ モデルの初期化が完了しました！話しかけてみてね。")
+    elif kind == "error":
+        await channel.send(f"⚠️ 音声認識でエラーが発生しました: `{event.get('message')}`")
+    elif kind == "state":
+        print(f"[音声認識] {event.get('state')}")
+    elif not listening:
+        # 一時停止の直前に届いた結果には反応しない
+        return
+    elif kind == "partial":
+        # 話し始めた時点で、あかりの発話を止めて聞く側に回る（返答は確定結果で行う）
+        print(f"[途中結果] {event['text']}")
+        scheduler_for(channel.guild).barge_in()
+        transcripts_for(speaker).extend()
+    elif kind == "final":
+        text = event["text"]
+        print(
+            f"[確定結果] {speaker or 'mic'}: {text} ({event['start']:.2f}-{event['end']:.2f}s, "
+            f"logprob={event.get('avg_logprob')}, no_speech={event.get('no_speech_prob')}, "
+            f"{event['processing_time']:.2f}s)"
+        )
+        # 話しかけられたら、あかりの発話を止めて聞く側に回る
+        scheduler_for(channel.guild).barge_in()
+        transcripts_for(speaker).add(text)
 
 
 @bot.command()
 async def stop(ctx):
-    global transcribe_proc
-    if transcribe_proc:
-        transcribe_proc.terminate()
-        transcribe_proc = None
+    global listening
+    if listening and transcribe_proc is not None:
+        listening = False
+        for coalescer in transcripts.values():
+            coalescer.clear()
+        if VOICE_INPUT == "discord" and ctx.voice_client and ctx.voice_client.is_listening():
+            ctx.voice_client.stop_listening()
+        # プロセスは止めずに録音だけを止める（モデルは読み込んだまま）
+        await send_transcriber_command("pause")
         await ctx.send("🛑 通話モードを停止しました。")
     else:
         await ctx.send("⚠️ 現在は通話しておりません。")
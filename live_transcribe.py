@@ -1,113 +1,593 @@
-import pyaudio
 import numpy as np
-import webrtcvad
 import collections
+import wave
+import base64
+import threading
+import queue
 import time
 import sys
 import io
+import os
+import argparse
+import bisect
+import json
+import ctranslate2
 from faster_whisper import WhisperModel
+try:
+    from faster_whisper import BatchedInferencePipeline
+except ImportError:  # バッチ推論は faster-whisper 1.2 の clip_timestamps（秒）を前提にしている
+    BatchedInferencePipeline = None
+from akari_vad import (
+    SAMPLE_RATE, FRAME_DURATION, FRAME_SIZE, STREAMING, PARTIAL_STRIDE, VadSegmenter,
+)
 
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
 DEVICE_INDEX = 1
-SAMPLE_RATE = 16000
-FRAME_DURATION = 30  # ms
-FRAME_SIZE = int(SAMPLE_RATE * FRAME_DURATION / 1000)
-BUFFER_DURATION = 8  # 秒上限
-SILENCE_TIMEOUT = 1  # 無音と判定する時間（秒）
+FRAME_QUEUE_SIZE = int(60 * 1000 / FRAME_DURATION)  # 録音フレームの待ち行列（60秒分）
+SEGMENT_QUEUE_SIZE = 16  # 認識待ちの発話区間の上限
+STATS_INTERVAL = 30  # 秒
+RESET_FRAME = b""  # 一時停止したときに VAD の途中状態を捨てる印
+PARTIAL_BEAM_SIZE = 1  # 途中結果は速さ優先で greedy に探索する
 
-model = WhisperModel("large-v2", device="cuda", compute_type="float16")
-vad = webrtcvad.Vad(2)  # 感度（0:保守的, 3:積極的）
+# 推論プロファイル（コマンドライン引数で上書きできる）
+WHISPER_MODEL = os.getenv("AKARI_WHISPER_MODEL", "large-v2")
+WHISPER_DEVICE = os.getenv("AKARI_WHISPER_DEVICE", "auto")  # "auto", "cuda", "cpu"
+WHISPER_COMPUTE_TYPE = os.getenv("AKARI_WHISPER_COMPUTE_TYPE")  # 未指定なら cuda は float16、cpu は int8
+WHISPER_CPU_THREADS = int(os.getenv("AKARI_WHISPER_CPU_THREADS", 0))  # 0 なら CTranslate2 に任せる
+WHISPER_NUM_WORKERS = int(os.getenv("AKARI_WHISPER_NUM_WORKERS", 1))
+WHISPER_BEAM_SIZE = int(os.getenv("AKARI_WHISPER_BEAM_SIZE", 5))
+WHISPER_BATCH_SIZE = int(os.getenv("AKARI_WHISPER_BATCH_SIZE", 8))  # 1 なら1区間ずつ認識する
+BATCH_WINDOW = float(os.getenv("AKARI_BATCH_WINDOW", 0.05))  # 確定結果をまとめて認識するために待つ時間（秒）
+CLIP_TOLERANCE = 0.2  # 結果の時刻が区間からはみ出してもよい幅（秒）
 
-print("READY", flush=True)
+model = None
+batched_model = None
+beam_size = WHISPER_BEAM_SIZE
+batch_size = WHISPER_BATCH_SIZE
+_emit_lock = threading.Lock()
 
-def frame_generator(stream):
+
+def emit(event: str, **fields):
+    """stdout に JSON Lines でイベントを書き出す（ready / state / partial / final / error）"""
+    with _emit_lock:
+        print(json.dumps({"event": event, **fields}, ensure_ascii=False), flush=True)
+
+
+class CaptureStats:
+    """録音と認識の取りこぼしを数える。stdout は認識結果専用なので stderr に出力する"""
+
+    def __init__(self):
+        self.overflows = 0         # デバイス側でバッファが溢れた回数
+        self.dropped_frames = 0    # フレーム待ち行列が満杯で捨てたフレーム数
+        self.dropped_segments = 0  # 認識待ち行列が満杯で捨てた発話区間数
+        self.segments = 0
+        self.skipped_partials = 0  # 認識が追いつかず読み飛ばした途中結果
+        self.max_queue_depth = 0
+        self.audio_seconds = 0.0       # 確定結果として認識した音声の長さ
+        self.processing_seconds = 0.0  # その認識にかかった時間
+        self.batches = 0
+        self.max_batch_size = 0
+        self.queue_latency = 0.0       # 確定結果が認識待ち行列で待った時間の合計
+        self.max_queue_latency = 0.0
+        self._last_report = time.time()
+
+    def observe_queue(self, depth: int):
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def observe_rtf(self, audio_seconds: float, processing_seconds: float):
+        self.audio_seconds += audio_seconds
+        self.processing_seconds += processing_seconds
+        print(
+            f"[rtf] audio={audio_seconds:.2f}s processing={processing_seconds:.2f}s "
+            f"rtf={processing_seconds / audio_seconds:.2f}",
+            file=sys.stderr, flush=True,
+        )
+
+    def observe_batch(self, latencies: list):
+        self.batches += 1
+        self.max_batch_size = max(self.max_batch_size, len(latencies))
+        self.queue_latency += sum(latencies)
+        self.max_queue_latency = max(self.max_queue_latency, *latencies)
+
+    def report(self, force: bool = False):
+        now = time.time()
+        if not force and now - self._last_report < STATS_INTERVAL:
+            return
+        self._last_report = now
+        print(
+            f"[stats] segments={self.segments} skipped_partials={self.skipped_partials} "
+            f"overflows={self.overflows} "
+            f"dropped_frames={self.dropped_frames} dropped_segments={self.dropped_segments} "
+            f"max_queue_depth={self.max_queue_depth} "
+            f"avg_batch={self.segments / self.batches if self.batches else 0:.2f} max_batch={self.max_batch_size} "
+            f"queue_latency(avg/max)={self.queue_latency / self.segments if self.segments else 0:.2f}"
+            f"/{self.max_queue_latency:.2f}s "
+            f"rtf={self.processing_seconds / self.audio_seconds if self.audio_seconds else 0:.2f}",
+            file=sys.stderr, flush=True,
+        )
+
+
+stats = CaptureStats()
+
+
+class MicSource:
+    """PyAudio のマイク入力。PortAudio のコールバックで録音フレームを待ち行列に積む（認識中も読み取りが止まらない）"""
+    realtime = True
+
+    def __init__(self, device_index: int = DEVICE_INDEX):
+        self.device_index = device_index
+        self._pa = None
+        self._stream = None
+
+    def start(self, frame_queue):
+        import pyaudio  # ファイル入力だけならマイク用のライブラリは不要
+
+        def callback(in_data, frame_count, time_info, status_flags):
+            if status_flags & pyaudio.paInputOverflow:
+                stats.overflows += 1
+            try:
+                frame_queue.put_nowait(in_data)
+            except queue.Full:
+                stats.dropped_frames += 1
+            return (None, pyaudio.paContinue)
+
+        self._pa = pyaudio.PyAudio()
+        self._stream = self._pa.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=SAMPLE_RATE,
+            input=True,
+            input_device_index=self.device_index,
+            frames_per_buffer=FRAME_SIZE,
+            stream_callback=callback,
+        )
+
+    def close(self):
+        if self._stream:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._pa.terminate()
+            self._stream = None
+
+def read_frames(path: str):
+    """WAV、raw PCM のファイル、または標準入力（"-"）から FRAME_SIZE ごとのフレームを返す（端数は捨てる）"""
+    frame_bytes = FRAME_SIZE * 2
+    if path.lower().endswith(".wav"):
+        with wave.open(path, "rb") as wav:
+            if (wav.getframerate(), wav.getnchannels(), wav.getsampwidth()) != (SAMPLE_RATE, 1, 2):
+                raise ValueError(f"{path}: 16kHz・モノラル・16bit の WAV にだけ対応しています")
+            while True:
+                frame = wav.readframes(FRAME_SIZE)
+                if len(frame) < frame_bytes:
+                    return
+                yield frame
+
+    # raw PCM は 16kHz・モノラル・16bit（リトルエンディアン）とみなす
+    f = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        while True:
+            frame = f.read(frame_bytes)
+            if len(frame) < frame_bytes:
+                return
+            yield frame
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+
+class FileSource:
+    """
+    ファイルや標準入力の音声を、実時間（realtime=True）または最速で流す。
+    close() で一時停止し、もう一度 start() すると続きから流す。
+    """
+
+    def __init__(self, path: str, realtime: bool = True):
+        self.path = path
+        self.realtime = realtime
+        self._running = threading.Event()
+        self._thread = None
+
+    def start(self, frame_queue):
+        self._running.set()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(frame_queue,), daemon=True)
+            self._thread.start()
+
+    def _run(self, frame_queue):
+        started = None
+        sent = 0
+        try:
+            for frame in read_frames(self.path):
+                if not self._running.is_set():
+                    self._running.wait()
+                    started = None  # 再開したところから実時間を数え直す
+                if not self.realtime:
+                    frame_queue.put(frame)  # 最速で流すときは取りこぼさないよう空きを待つ
+                    continue
+                if started is None:
+                    started, sent = time.perf_counter(), 0
+                delay = started + sent * FRAME_DURATION / 1000 - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                sent += 1
+                try:
+                    frame_queue.put_nowait(frame)
+                except queue.Full:
+                    stats.dropped_frames += 1
+        except Exception as e:
+            emit("error", message=f"音声を読み込めませんでした: {e}")
+        frame_queue.put(None)
+
+    def close(self):
+        self._running.clear()
+
+class NullSource:
+    """音声を読み込まない入力。標準入力の segment コマンドで届く発話区間だけを認識する（voice_ingest.py 用）"""
+    realtime = True
+
+    def start(self, frame_queue):
+        pass
+
+    def close(self):
+        pass
+
+def frame_generator(frame_queue):
     while True:
-        yield stream.read(FRAME_SIZE, exception_on_overflow=False)
-
-def vad_collector(stream):
-    ring_buffer = collections.deque(maxlen=int(SILENCE_TIMEOUT * 1000 / FRAME_DURATION))
-    voiced_frames = []
-    triggered = False
-    start_time = time.time()
-
-    for frame in frame_generator(stream):
-        is_speech = vad.is_speech(frame, SAMPLE_RATE)
-
-        if not triggered:
-            ring_buffer.append((frame, is_speech))
-            num_voiced = len([f for f, speech in ring_buffer if speech])
-            if num_voiced > 0.9 * ring_buffer.maxlen:
-                triggered = True
-                voiced_frames.extend(f for f, s in ring_buffer)
-                ring_buffer.clear()
-        else:
-            voiced_frames.append(frame)
-            ring_buffer.append((frame, is_speech))
-            num_unvoiced = len([f for f, speech in ring_buffer if not speech])
-            if num_unvoiced > 0.8 * ring_buffer.maxlen:
-                yield b''.join(voiced_frames)
-                triggered = False
-                voiced_frames = []
-                ring_buffer.clear()
-                start_time = time.time()
-
-        if time.time() - start_time > BUFFER_DURATION:
-            if voiced_frames:
-                yield b''.join(voiced_frames)
-                voiced_frames = []
-            triggered = False
-            ring_buffer.clear()
-            start_time = time.time()
-
-def start_stream():
-    pa = pyaudio.PyAudio()
-    stream = pa.open(
-        format=pyaudio.paInt16,
-        channels=1,
-        rate=SAMPLE_RATE,
-        input=True,
-        input_device_index=DEVICE_INDEX,
-        frames_per_buffer=FRAME_SIZE
+        frame = frame_queue.get()
+        if frame is None:
+            return
+        yield frame
+
+def vad_collector(frames, partial_stride: float = None):
+    """
+    フレーム列を VAD で区切り、(音声, 確定か, 開始位置の秒数) を返す。
+    partial_stride を指定すると、発話中もその間隔でそこまでの音声を確定前の結果として返す。
+    RESET_FRAME を受け取ったら話している途中の音声を捨てる。
+    """
+    segmenter = VadSegmenter(partial_stride)
+    for frame in frames:
+        if frame == RESET_FRAME:
+            segmenter.reset()
+            continue
+        yield from segmenter.push(frame)
+    yield from segmenter.flush()
+
+class LocalAgreement:
+    """
+    伸びていく音声を認識し直した仮説のうち、連続する2回で一致した先頭部分だけを確定扱いにする。
+    一度出した途中結果は取り消さないので、確定部分が伸びたときだけ返す。
+    """
+
+    def __init__(self):
+        self.previous = ""
+        self.stable = ""
+
+    def update(self, hypothesis: str):
+        prefix = os.path.commonprefix([self.previous, hypothesis])
+        self.previous = hypothesis
+        if len(prefix) > len(self.stable) and prefix.startswith(self.stable):
+            self.stable = prefix
+            return prefix
+        return None
+
+    def reset(self):
+        self.previous = ""
+        self.stable = ""
+
+def capture_worker(frame_queue, segment_queue, block: bool = False):
+    """
+    VAD で区切った発話区間を認識待ち行列に渡す（専用スレッド）。
+    block=True なら確定結果は待ち行列が空くまで待つ（ファイルを最速で流すとき）。
+    """
+    partial_stride = PARTIAL_STRIDE if STREAMING else None
+    for segment, final, start in vad_collector(frame_generator(frame_queue), partial_stride):
+        if final and block:
+            segment_queue.put((segment, final, start, None, time.monotonic()))
+            stats.observe_queue(segment_queue.qsize())
+            continue
+        try:
+            segment_queue.put_nowait((segment, final, start, None, time.monotonic()))
+        except queue.Full:
+            if final:
+                stats.dropped_segments += 1
+            else:
+                stats.skipped_partials += 1
+        stats.observe_queue(segment_queue.qsize())
+    segment_queue.put(None)
+
+def _to_float(segment: bytes):
+    return np.frombuffer(segment, dtype=np.int16).astype(np.float32) / 32768.0
+
+def _result(segments, processing_time: float) -> dict:
+    return {
+        "text": "".join(seg.text.strip() for seg in segments),
+        "avg_logprob": round(sum(seg.avg_logprob for seg in segments) / len(segments), 3) if segments else None,
+        "no_speech_prob": round(sum(seg.no_speech_prob for seg in segments) / len(segments), 3) if segments else None,
+        "processing_time": round(processing_time, 3),
+    }
+
+def transcribe(segment: bytes, final: bool = True) -> dict:
+    """発話区間を認識し、テキストと信頼度の目安（平均対数確率・無音確率）と認識時間を返す"""
+    audio_np = _to_float(segment)
+    started = time.perf_counter()
+    # webrtcvad で区切った音声なので、faster-whisper 側の VAD はかけない
+    segments, _ = model.transcribe(
+        audio_np, language="ja", vad_filter=False,
+        beam_size=beam_size if final else PARTIAL_BEAM_SIZE,
     )
+    # segments は遅延評価なので、取り出し終わるまでが認識時間
+    segments = list(segments)
+    processing_time = time.perf_counter() - started
+    if final:
+        stats.observe_rtf(len(audio_np) / SAMPLE_RATE, processing_time)
+    return _result(segments, processing_time)
 
+def transcribe_batch(segments: list) -> list:
+    """
+    複数の発話区間をつなげて BatchedInferencePipeline でまとめて認識し、区間ごとの結果を同じ順番で返す。
+    faster-whisper 1.2 では clip_timestamps（秒）の各区間が別々のバッチ要素になる。
+    """
+    if batched_model is None or len(segments) == 1:
+        return [transcribe(segment) for segment in segments]
+
+    audios = [_to_float(segment) for segment in segments]
+    clips = []
+    offset = 0
+    for audio_np in audios:
+        clips.append((offset / SAMPLE_RATE, (offset + len(audio_np)) / SAMPLE_RATE))
+        offset += len(audio_np)
+    clip_starts = [start for start, _ in clips]
+
+    started = time.perf_counter()
     try:
-        buffer_text = ""
-        buffer_time = time.time()
+        results, _ = batched_model.transcribe(
+            np.concatenate(audios), language="ja", vad_filter=False,
+            clip_timestamps=[{"start": start, "end": end} for start, end in clips],
+            batch_size=len(segments), beam_size=beam_size,
+        )
+        results = list(results)
+    except Exception as e:
+        print(f"[batch] まとめて認識できなかったので1区間ずつ認識します: {e}", file=sys.stderr, flush=True)
+        return [transcribe(segment) for segment in segments]
+    processing_time = time.perf_counter() - started
+    stats.observe_rtf(offset / SAMPLE_RATE, processing_time)
+
+    # つなげた音声上の時刻から、どの区間の結果かを戻す。区間に収まらない結果があれば混ざっているので認識し直す
+    grouped = [[] for _ in segments]
+    for seg in results:
+        index = max(bisect.bisect_right(clip_starts, seg.start + CLIP_TOLERANCE) - 1, 0)
+        clip_start, clip_end = clips[index]
+        if seg.start < clip_start - CLIP_TOLERANCE or seg.end > clip_end + CLIP_TOLERANCE:
+            print("[batch] 区間に収まらない結果があったので1区間ずつ認識し直します", file=sys.stderr, flush=True)
+            return [transcribe(segment) for segment in segments]
+        grouped[index].append(seg)
+    return [_result(group, processing_time) for group in grouped]
+
+class TranscriptionService:
+    """
+    モデルを読み込んだまま動き続ける文字起こしサービス。
+    標準入力のコマンド（pause / resume / quit、または {"cmd": "pause"} のような JSON）で
+    録音を止めたり再開したりでき、結果は JSON Lines のイベントとして stdout に出す。
+    {"cmd": "segment", "speaker": ..., "pcm": <base64>, "final": true, "start": 秒} で
+    外で区切った発話区間（16kHz・モノラル・16bit）も認識できる。
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.frame_queue = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+        self.segment_queue = queue.Queue(maxsize=SEGMENT_QUEUE_SIZE)
+        self.paused = False
+        self._lock = threading.Lock()
+
+    def pause(self):
+        with self._lock:
+            if self.paused:
+                return
+            self.paused = True
+            self.source.close()
+            self.frame_queue.put(RESET_FRAME)
+        emit("state", state="paused")
+
+    def resume(self):
+        with self._lock:
+            if not self.paused:
+                return
+            self.paused = False
+            self.source.start(self.frame_queue)
+        emit("state", state="listening")
+
+    def quit(self):
+        self.segment_queue.put(None)
 
-        for segment in vad_collector(stream):
-            audio_np = np.frombuffer(segment, dtype=np.int16).astype(np.float32) / 32768.0
-            segments, _ = model.transcribe(audio_np, language="ja", vad_filter=True)
+    def collect_batch(self, first) -> list:
+        """最初の確定結果から BATCH_WINDOW のあいだに届いた確定結果を、batch_size 件までまとめる"""
+        batch = [first]
+        deadline = time.monotonic() + BATCH_WINDOW
+        while len(batch) < batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self.segment_queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                self.segment_queue.put(None)  # 終了の印はバッチを認識したあとに受け取る
+                break
+            if item[1]:
+                batch.append(item)
+            else:
+                # 確定結果より後ろにある途中結果はすぐ古くなるので読み飛ばす
+                stats.skipped_partials += 1
+        return batch
 
-            for seg in segments:
-                text = seg.text.strip()
-                now = time.time()
+    def submit_segment(self, command: dict):
+        if self.paused:
+            return
+        final = command.get("final", True)
+        item = (
+            base64.b64decode(command["pcm"]), final, command.get("start", 0.0), command.get("speaker"),
+            time.monotonic(),
+        )
+        try:
+            self.segment_queue.put_nowait(item)
+        except queue.Full:
+            if final:
+                stats.dropped_segments += 1
+            else:
+                stats.skipped_partials += 1
+        stats.observe_queue(self.segment_queue.qsize())
 
-                if not text:
+    def handle_command(self, line: str):
+        line = line.strip()
+        if not line:
+            return
+        command = json.loads(line) if line.startswith("{") else {"cmd": line}
+        name = command.get("cmd", "")
+        if name == "segment":
+            self.submit_segment(command)
+            return
+        handler = {"pause": self.pause, "resume": self.resume, "quit": self.quit}.get(name)
+        if handler is None:
+            emit("error", message=f"不明なコマンドです: {name}")
+            return
+        handler()
+
+    def read_commands(self, stream):
+        for line in stream:
+            try:
+                self.handle_command(line)
+            except Exception as e:
+                emit("error", message=f"コマンドを処理できませんでした: {e}")
+        # 親プロセスが標準入力を閉じたら終了する
+        self.quit()
+
+    def run(self, read_commands: bool = True):
+        threading.Thread(
+            target=capture_worker,
+            args=(self.frame_queue, self.segment_queue, not self.source.realtime),
+            daemon=True,
+        ).start()
+        if read_commands:
+            threading.Thread(target=self.read_commands, args=(sys.stdin,), daemon=True).start()
+        self.source.start(self.frame_queue)
+        emit("state", state="listening")
+
+        # 途中結果の一致は話者ごとに見る（マイクの音声は話者 None）
+        agreements = collections.defaultdict(LocalAgreement)
+        try:
+            while True:
+                try:
+                    item = self.segment_queue.get(timeout=0.5)
+                except queue.Empty:
+                    stats.report()
+                    continue
+                if item is None:
+                    break
+                segment, final, start, speaker, _ = item
+                if self.paused:
+                    # 一時停止する前に区切られた音声も、止めたあとには返さない
+                    agreements.clear()
                     continue
+                fields = {"speaker": speaker} if speaker is not None else {}
 
-                if len(text) <= 4:
-                    if buffer_text and len(buffer_text) <= 4:
-                        buffer_text += text
-                    else:
-                        buffer_text = text
-                else:
-                    if buffer_text:
-                        if len(buffer_text) < 5:
-                            text = buffer_text + text
-                            buffer_text = ""
-                    print(text, flush=True)
-
-        if buffer_text:
-            print(buffer_text, flush=True)
-
-    except KeyboardInterrupt:
-        pass
-    finally:
-        stream.stop_stream()
-        stream.close()
-        pa.terminate()
+                try:
+                    if not final:
+                        # 後ろに新しい音声が届いていれば、古い途中結果は認識しない
+                        if not self.segment_queue.empty():
+                            stats.skipped_partials += 1
+                            continue
+                        partial = agreements[speaker].update(transcribe(segment, final=False)["text"])
+                        if partial:
+                            emit("partial", text=partial, start=round(start, 2), **fields)
+                        continue
+
+                    batch = self.collect_batch(item)
+                    stats.observe_batch([time.monotonic() - enqueued for *_, enqueued in batch])
+                    results = transcribe_batch([segment for segment, *_ in batch])
+                    # 届いた順に、それぞれの話者の結果として返す
+                    for (segment, _, start, speaker, _), result in zip(batch, results):
+                        stats.segments += 1
+                        agreements.pop(speaker, None)
+                        if result["text"]:
+                            end = start + len(segment) / 2 / SAMPLE_RATE
+                            fields = {"speaker": speaker} if speaker is not None else {}
+                            emit("final", start=round(start, 2), end=round(end, 2), **fields, **result)
+                except Exception as e:
+                    emit("error", message=f"文字起こしに失敗しました: {e}")
+                stats.report()
+
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.source.close()
+            try:
+                self.frame_queue.put_nowait(None)
+            except queue.Full:
+                pass
+            stats.report(force=True)
+            emit("state", state="stopped")
+
+
+def add_profile_arguments(parser):
+    """推論プロファイルの引数（ベンチマークと共通）"""
+    parser.add_argument("--model", default=WHISPER_MODEL, help="モデル名またはパス（例: large-v2, medium, small）")
+    parser.add_argument("--device", default=WHISPER_DEVICE, choices=["auto", "cuda", "cpu"])
+    parser.add_argument("--compute-type", default=WHISPER_COMPUTE_TYPE,
+                        help="float16, int8_float16, int8, int8_float32 など（未指定なら端末に合わせる）")
+    parser.add_argument("--cpu-threads", type=int, default=WHISPER_CPU_THREADS)
+    parser.add_argument("--num-workers", type=int, default=WHISPER_NUM_WORKERS)
+    parser.add_argument("--beam-size", type=int, default=WHISPER_BEAM_SIZE)
+    parser.add_argument("--batch-size", type=int, default=WHISPER_BATCH_SIZE,
+                        help="まとめて認識する発話区間の上限（1 でバッチ推論を使わない）")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="マイクや音声ファイルを faster-whisper で文字起こしする")
+    parser.add_argument("--input", default="mic",
+                        help='"mic"（マイク）、WAV / raw PCM（16kHz・モノラル・16bit）のパス、"-"（標準入力）、'
+                             'または "none"（segment コマンドで届く音声だけを認識する）')
+    parser.add_argument("--device-index", type=int, default=DEVICE_INDEX, help="マイクの PyAudio デバイス番号")
+    parser.add_argument("--fast", action="store_true", help="ファイルを実時間ではなく最速で流す")
+    add_profile_arguments(parser)
+    return parser.parse_args(argv)
+
+def create_source(args):
+    if args.input == "mic":
+        return MicSource(args.device_index)
+    if args.input == "none":
+        return NullSource()
+    return FileSource(args.input, realtime=not args.fast)
+
+def load_model(args):
+    """推論プロファイルに従ってモデルを読み込む。GPU がなければ CPU の int8 で動かす"""
+    global model, batched_model, beam_size, batch_size
+    device = args.device
+    if device == "auto":
+        device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    compute_type = args.compute_type or ("float16" if device == "cuda" else "int8")
+    print(
+        f"[profile] model={args.model} device={device} compute_type={compute_type} "
+        f"cpu_threads={args.cpu_threads} num_workers={args.num_workers} beam_size={args.beam_size} "
+        f"batch_size={args.batch_size}",
+        file=sys.stderr, flush=True,
+    )
+    model = WhisperModel(
+        args.model, device=device, compute_type=compute_type,
+        cpu_threads=args.cpu_threads, num_workers=args.num_workers,
+    )
+    beam_size = args.beam_size
+    batch_size = max(args.batch_size, 1)
+    if batch_size > 1 and BatchedInferencePipeline is not None:
+        batched_model = BatchedInferencePipeline(model=model)
 
 
 if __name__ == "__main__":
-    start_stream()
+    args = parse_args()
+    try:
+        load_model(args)
+    except Exception as e:
+        emit("error", message=f"モデルを読み込めませんでした: {e}")
+        sys.exit(1)
+    emit("ready", model=args.model)
+    # 標準入力を音声に使うときはコマンドを受け付けない
+    TranscriptionService(create_source(args)).run(read_commands=args.input != "-")
@@ -1,6 +1,10 @@
 @echo off
 setlocal
 set SPEED=%1
+set OUTPUT="%~2"
+set CID=%3
+shift
+shift
 shift
 
 set TEXT=
@@ -12,5 +16,4 @@ goto loop
 :done
 
 set SEIKA="assistantseika\SeikaSay2\SeikaSay2.exe"
-set OUTPUT="output.wav"
-%SEIKA% -cid 60051 -save %OUTPUT% -volume 1.0 -speed %SPEED% -intonation 1.0 -t "%TEXT%"
+%SEIKA% -cid %CID% -save %OUTPUT% -volume 1.0 -speed %SPEED% -intonation 1.0 -t "%TEXT%"
@@ -1,8 +1,6 @@
-import os
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from functools import lru_cache
+from tools.google_service import get_service
+from tools import calender_store
 from langchain.tools import Tool
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
@@ -10,23 +8,18 @@ CREDENTIALS_FILE = 'client_secret_writer.json'
 TOKEN_FILE = 'token_writer.json'
 
 def authorize_google_calendar():
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_FILE, 'w') as token:
-            token.write(creds.to_json())
-    return build('calendar', 'v3', credentials=creds)
+    return get_service('calendar', 'v3', SCOPES, TOKEN_FILE, CREDENTIALS_FILE)
+
+@lru_cache(maxsize=1)
+def writer_calendar_id() -> str:
+    """書き込み用アカウントの 'primary' の実際のカレンダーID"""
+    return authorize_google_calendar().calendarList().get(calendarId='primary').execute()['id']
 
 def delete_event_by_id(event_id: str) -> str:
     try:
         service = authorize_google_calendar()
         service.events().delete(calendarId='primary', eventId=event_id).execute()
+        calender_store.delete_event(writer_calendar_id(), event_id)
         return f"🗑️ 予定（ID: {event_id}）を削除しました。"
     except Exception as e:
         return f"❌ 削除エラー: {e}"
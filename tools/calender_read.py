@@ -1,33 +1,24 @@
-import os
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from tools.google_service import get_service
 from langchain.tools import Tool
 from dateutil import parser
 from config import CALENDAR_LABELS
+from tools import calender_store
 
 SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
 CREDENTIALS_FILE = 'client_secret_reader.json'
 TOKEN_FILE = 'token_reader.json'
+MAX_FETCH_WORKERS = 8
 
 JST = datetime.timezone(datetime.timedelta(hours=9))
 
+# スレッドごとのサービスオブジェクトを使い回せるよう、同期用のスレッドは呼び出しをまたいで共有する
+_sync_executor = ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS, thread_name_prefix="calendar-sync")
+
 def authorize_google_calendar():
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_FILE, 'w') as token:
-            token.write(creds.to_json())
-    return build('calendar', 'v3', credentials=creds)
+    return get_service('calendar', 'v3', SCOPES, TOKEN_FILE, CREDENTIALS_FILE)
 
 def list_accessible_calendars(service) -> List[Dict]:
     result = service.calendarList().list().execute()
@@ -35,20 +26,24 @@ def list_accessible_calendars(service) -> List[Dict]:
         {
             "id": item["id"],
             "summary": item.get("summary", "(no name)"),
-            "accessRole": item.get("accessRole")
+            "accessRole": item.get("accessRole"),
+            "primary": item.get("primary", False)
         }
         for item in result.get("items", [])
     ]
 
-def fetch_events(service, calendar_id: str, start_iso: str, end_iso: str) -> List[Dict]:
-    result = service.events().list(
-        calendarId=calendar_id,
-        timeMin=start_iso,
-        timeMax=end_iso,
-        singleEvents=True,
-        orderBy='startTime',
-    ).execute()
-    return result.get("items", [])
+def sync_calendars(calendar_ids: List[str]):
+    """
+    同期が必要なカレンダーだけをローカルミラーへ並列に同期する。
+    サービスオブジェクトはスレッドごとに google_service から取得し、共有のスレッドで使い回す。
+    """
+    def sync(calendar_id):
+        calender_store.sync_calendar(authorize_google_calendar(), calendar_id)
+
+    stale = [calendar_id for calendar_id in calendar_ids if calender_store.needs_sync(calendar_id)]
+    if not stale:
+        return
+    list(_sync_executor.map(sync, stale))
 
 def iso_range_from_now(hours=24):
     now = datetime.datetime.utcnow()
@@ -69,9 +64,14 @@ def get_calendar_summary(hours: str) -> str:
     """
     try:
         hrs = int(hours)
-        service = authorize_google_calendar()
-        timeMin, timeMax = iso_range_from_now(hrs)
-        calendars = list_accessible_calendars(service)
+        calendars = calender_store.load_calendars(max_age=calender_store.SYNC_INTERVAL)
+        if calendars is None:
+            calendars = list_accessible_calendars(authorize_google_calendar())
+            calender_store.save_calendars(calendars)
+        sync_calendars([cal['id'] for cal in calendars])
+
+        start_ts = datetime.datetime.now(datetime.timezone.utc).timestamp()
+        end_ts = start_ts + hrs * 60 * 60
 
         lines = []
         lines.append(
@@ -83,7 +83,7 @@ def get_calendar_summary(hours: str) -> str:
         for cal in calendars:
             label = describe_calendar(cal["summary"], cal["accessRole"])
             lines.append(f"\n📅 カレンダー: {cal['summary']} {label}")
-            events = fetch_events(service, cal['id'], timeMin, timeMax)
+            events = calender_store.query_events(cal['id'], start_ts, end_ts)
             if not events:
                 lines.append("  - 予定なし")
             for event in events:
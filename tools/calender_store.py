@@ -0,0 +1,235 @@
+import json
+import time
+import sqlite3
+import datetime
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Optional
+from dateutil import parser
+from googleapiclient.errors import HttpError
+
+# Googleカレンダーのローカルミラー（SQLite）。
+# カレンダーごとに一度だけフル同期し、以降は syncToken による差分同期を行う。
+# CalendarReader はここに対する範囲クエリで予定を返す。
+
+DB_FILE = 'calendar_cache.db'
+SYNC_INTERVAL = 60                 # 差分同期の最小間隔（秒）
+FULL_SYNC_INTERVAL = 24 * 60 * 60  # 同期範囲を進めるためのフル同期間隔（秒）
+FULL_SYNC_PAST_DAYS = 30
+FULL_SYNC_FUTURE_DAYS = 365
+
+JST = datetime.timezone(datetime.timedelta(hours=9))
+
+_lock = threading.Lock()
+_initialized = False
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calendars (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    summary TEXT,
+    access_role TEXT,
+    is_primary INTEGER NOT NULL DEFAULT 0,
+    sync_token TEXT,
+    synced_at REAL,
+    full_synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS events (
+    calendar_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    summary TEXT,
+    start_json TEXT NOT NULL,
+    start_ts REAL NOT NULL,
+    end_ts REAL NOT NULL,
+    PRIMARY KEY (calendar_id, event_id)
+);
+CREATE INDEX IF NOT EXISTS idx_events_range ON events (calendar_id, start_ts, end_ts);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL
+);
+"""
+
+
+def _connect():
+    global _initialized
+    conn = sqlite3.connect(DB_FILE, timeout=10)
+    conn.row_factory = sqlite3.Row
+    if not _initialized:
+        conn.executescript(SCHEMA)
+        _initialized = True
+    return conn
+
+
+@contextmanager
+def _db():
+    conn = _connect()
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _to_timestamp(when: Dict) -> float:
+    if "dateTime" in when:
+        return parser.isoparse(when["dateTime"]).timestamp()
+    # 終日予定は JST の0時として扱う
+    day = parser.isoparse(when["date"]).date()
+    return datetime.datetime(day.year, day.month, day.day, tzinfo=JST).timestamp()
+
+
+def _apply_events(conn, calendar_id: str, events: List[Dict]):
+    for event in events:
+        if event.get("status") == "cancelled" or "start" not in event:
+            conn.execute(
+                "DELETE FROM events WHERE calendar_id = ? AND event_id = ?",
+                (calendar_id, event["id"]),
+            )
+            continue
+        start_ts = _to_timestamp(event["start"])
+        end_ts = _to_timestamp(event["end"]) if "end" in event else start_ts
+        conn.execute(
+            "INSERT OR REPLACE INTO events (calendar_id, event_id, summary, start_json, start_ts, end_ts) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (calendar_id, event["id"], event.get("summary"), json.dumps(event["start"]), start_ts, end_ts),
+        )
+
+
+# === カレンダー一覧 ===
+def load_calendars(max_age: float) -> Optional[List[Dict]]:
+    """保存済みのカレンダー一覧を返す。max_age 秒より古ければ None"""
+    with _db() as conn:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'calendars_synced_at'").fetchone()
+        if row is None or time.time() - row["value"] > max_age:
+            return None
+        rows = conn.execute("SELECT * FROM calendars ORDER BY position").fetchall()
+    return [
+        {"id": r["id"], "summary": r["summary"], "accessRole": r["access_role"], "primary": bool(r["is_primary"])}
+        for r in rows
+    ]
+
+
+def save_calendars(calendars: List[Dict]):
+    with _lock, _db() as conn:
+        ids = [cal["id"] for cal in calendars]
+        placeholders = ",".join("?" * len(ids)) or "''"
+        conn.execute(f"DELETE FROM events WHERE calendar_id NOT IN ({placeholders})", ids)
+        conn.execute(f"DELETE FROM calendars WHERE id NOT IN ({placeholders})", ids)
+        for position, cal in enumerate(calendars):
+            conn.execute(
+                "INSERT INTO calendars (id, position, summary, access_role, is_primary) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET position = excluded.position, summary = excluded.summary, "
+                "access_role = excluded.access_role, is_primary = excluded.is_primary",
+                (cal["id"], position, cal["summary"], cal["accessRole"], int(cal.get("primary", False))),
+            )
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('calendars_synced_at', ?)", (time.time(),)
+        )
+
+
+def _is_mirrored(conn, calendar_id: str) -> bool:
+    return conn.execute("SELECT 1 FROM calendars WHERE id = ?", (calendar_id,)).fetchone() is not None
+
+
+# === 同期 ===
+def needs_sync(calendar_id: str) -> bool:
+    with _db() as conn:
+        row = conn.execute(
+            "SELECT synced_at FROM calendars WHERE id = ?", (calendar_id,)
+        ).fetchone()
+    return row is None or row["synced_at"] is None or time.time() - row["synced_at"] > SYNC_INTERVAL
+
+
+def _list_all(service, **params):
+    """ページングをたどって (items, nextSyncToken) を返す"""
+    items = []
+    page_token = None
+    while True:
+        result = service.events().list(singleEvents=True, pageToken=page_token, **params).execute()
+        items.extend(result.get("items", []))
+        page_token = result.get("nextPageToken")
+        if not page_token:
+            return items, result.get("nextSyncToken")
+
+
+def sync_calendar(service, calendar_id: str):
+    """
+    カレンダー1つ分をミラーに同期する。
+    syncToken があれば差分同期、なければ（または失効していれば）フル同期。
+    """
+    with _db() as conn:
+        row = conn.execute(
+            "SELECT sync_token, full_synced_at FROM calendars WHERE id = ?", (calendar_id,)
+        ).fetchone()
+    sync_token = row["sync_token"] if row else None
+    full_synced_at = row["full_synced_at"] if row else None
+    if full_synced_at is None or time.time() - full_synced_at > FULL_SYNC_INTERVAL:
+        sync_token = None
+
+    now = time.time()
+    if sync_token:
+        try:
+            events, next_token = _list_all(service, calendarId=calendar_id, syncToken=sync_token)
+            with _lock, _db() as conn:
+                _apply_events(conn, calendar_id, events)
+                conn.execute(
+                    "UPDATE calendars SET sync_token = ?, synced_at = ? WHERE id = ?",
+                    (next_token, now, calendar_id),
+                )
+            return
+        except HttpError as e:
+            # 410 Gone: syncToken が失効したのでフル同期からやり直す
+            if e.resp.status != 410:
+                raise
+
+    utcnow = datetime.datetime.now(datetime.timezone.utc)
+    events, next_token = _list_all(
+        service,
+        calendarId=calendar_id,
+        timeMin=(utcnow - datetime.timedelta(days=FULL_SYNC_PAST_DAYS)).isoformat(),
+        timeMax=(utcnow + datetime.timedelta(days=FULL_SYNC_FUTURE_DAYS)).isoformat(),
+        maxResults=2500,
+    )
+    with _lock, _db() as conn:
+        conn.execute("DELETE FROM events WHERE calendar_id = ?", (calendar_id,))
+        _apply_events(conn, calendar_id, events)
+        conn.execute(
+            "UPDATE calendars SET sync_token = ?, synced_at = ?, full_synced_at = ? WHERE id = ?",
+            (next_token, now, now, calendar_id),
+        )
+
+
+# === 読み取り ===
+def query_events(calendar_id: str, start_ts: float, end_ts: float) -> List[Dict]:
+    """[start_ts, end_ts) に重なる予定を開始時刻順に返す"""
+    with _db() as conn:
+        rows = conn.execute(
+            "SELECT event_id, summary, start_json FROM events "
+            "WHERE calendar_id = ? AND start_ts < ? AND end_ts > ? ORDER BY start_ts",
+            (calendar_id, end_ts, start_ts),
+        ).fetchall()
+    events = []
+    for r in rows:
+        event = {"id": r["event_id"], "start": json.loads(r["start_json"])}
+        if r["summary"] is not None:
+            event["summary"] = r["summary"]
+        events.append(event)
+    return events
+
+
+# === 書き込みの即時反映 ===
+# 書き込みは読み取りとは別のアカウントで行うので、'primary' ではなく実際のカレンダーIDを渡すこと。
+# ミラーしていないカレンダーへの書き込みは反映しない（次の同期で取り込まれる）。
+def upsert_event(calendar_id: str, event: Dict):
+    with _lock, _db() as conn:
+        if _is_mirrored(conn, calendar_id):
+            _apply_events(conn, calendar_id, [event])
+
+
+def delete_event(calendar_id: str, event_id: str):
+    with _lock, _db() as conn:
+        if _is_mirrored(conn, calendar_id):
+            conn.execute(
+                "DELETE FROM events WHERE calendar_id = ? AND event_id = ?", (calendar_id, event_id)
+            )
@@ -1,10 +1,7 @@
-import os
 from datetime import datetime, timedelta, timezone
 from typing import Dict
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from tools.google_service import get_service
+from tools import calender_store
 from langchain.tools import Tool
 from dateutil import parser
 
@@ -14,19 +11,7 @@ TOKEN_FILE = 'token_writer.json'
 JST = timezone(timedelta(hours=9))
 
 def authorize_google_calendar():
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                CREDENTIALS_FILE, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_FILE, 'w') as token:
-            token.write(creds.to_json())
-    return build('calendar', 'v3', credentials=creds)
+    return get_service('calendar', 'v3', SCOPES, TOKEN_FILE, CREDENTIALS_FILE)
 
 def parse_event_details(input_text: str) -> Dict:
     """
@@ -77,6 +62,10 @@ def add_event_to_calendar(input_text: str) -> str:
             }
 
         created = service.events().insert(calendarId='primary', body=event).execute()
+        # 'primary' は書き込み用アカウントのカレンダーなので、主催者のアドレス（= カレンダーID）で反映する
+        organizer = created.get("organizer", {}).get("email")
+        if organizer:
+            calender_store.upsert_event(organizer, created)
         return f"✅ 予定を追加しました: {created.get('summary')}（{created['start'].get('dateTime') or created['start'].get('date')}）"
 
     except Exception as e:
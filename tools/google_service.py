@@ -0,0 +1,138 @@
+import os
+import json
+import threading
+import datetime
+import httplib2
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build_from_document
+
+# Google API の認証情報とサービスオブジェクトを全ツールで共有する。
+# 認証情報はトークンファイル＋スコープごとにプロセス内で1つだけ保持し、
+# 期限切れ前にバックグラウンドで更新する。
+# httplib2 はスレッドセーフではないため、サービスオブジェクトはスレッドごとに作る。
+
+DISCOVERY_CACHE_DIR = '.discovery_cache'
+DISCOVERY_URI = 'https://www.googleapis.com/discovery/v1/apis/{api}/{version}/rest'
+REFRESH_MARGIN = datetime.timedelta(minutes=5)
+
+_lock = threading.RLock()
+_credentials = {}      # (token_file, scopes) -> Credentials
+_refresh_timers = {}   # (token_file, scopes) -> threading.Timer
+_documents = {}        # (api, version) -> discovery document (dict)
+_local = threading.local()
+
+
+def _save_token(token_file, creds):
+    with open(token_file, 'w') as token:
+        token.write(creds.to_json())
+
+
+def _authorize(token_file, credentials_file, scopes, creds=None):
+    if creds is None and os.path.exists(token_file):
+        creds = Credentials.from_authorized_user_file(token_file, scopes)
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            flow = InstalledAppFlow.from_client_secrets_file(credentials_file, scopes)
+            creds = flow.run_local_server(port=0)
+        _save_token(token_file, creds)
+    return creds
+
+
+def _schedule_refresh(key, creds):
+    """有効期限の REFRESH_MARGIN 前にトークンを更新するタイマーを仕掛ける"""
+    timer = _refresh_timers.pop(key, None)
+    if timer:
+        timer.cancel()
+    if not creds.expiry or not creds.refresh_token:
+        return
+
+    delay = (creds.expiry - REFRESH_MARGIN - datetime.datetime.utcnow()).total_seconds()
+    timer = threading.Timer(max(delay, 1.0), _refresh_in_background, args=(key,))
+    timer.daemon = True
+    _refresh_timers[key] = timer
+    timer.start()
+
+
+def _refresh_in_background(key):
+    token_file, _ = key
+    with _lock:
+        creds = _credentials.get(key)
+        if creds is None:
+            return
+        try:
+            creds.refresh(Request())
+            _save_token(token_file, creds)
+        except Exception as e:
+            # 失敗しても次回の get_credentials() で再認証される
+            print(f"[Google認証] トークンの事前更新に失敗: {e}")
+            return
+        _schedule_refresh(key, creds)
+
+
+def get_credentials(token_file, credentials_file, scopes):
+    key = (token_file, tuple(scopes))
+    with _lock:
+        creds = _credentials.get(key)
+        if creds is None or not creds.valid:
+            creds = _authorize(token_file, credentials_file, scopes, creds)
+            _credentials[key] = creds
+            _schedule_refresh(key, creds)
+        return creds
+
+
+def _load_discovery_document(api, version):
+    # 1) google-api-python-client 同梱のドキュメント
+    try:
+        from googleapiclient import discovery_cache
+        content = discovery_cache.get_static_doc(api, version)
+    except (ImportError, AttributeError):
+        content = None
+    if content:
+        return json.loads(content)
+
+    # 2) ローカルのディスクキャッシュ、3) ネットワーク（取得後はディスクに保存）
+    path = os.path.join(DISCOVERY_CACHE_DIR, f"{api}.{version}.json")
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    resp, content = httplib2.Http().request(DISCOVERY_URI.format(api=api, version=version))
+    if resp.status >= 400:
+        raise RuntimeError(f"discovery document の取得に失敗しました: {api} {version} ({resp.status})")
+    os.makedirs(DISCOVERY_CACHE_DIR, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return json.loads(content)
+
+
+def _discovery_document(api, version):
+    key = (api, version)
+    with _lock:
+        doc = _documents.get(key)
+        if doc is None:
+            doc = _load_discovery_document(api, version)
+            _documents[key] = doc
+        return doc
+
+
+def get_service(api, version, scopes, token_file, credentials_file):
+    """
+    認証済みの Google API サービスオブジェクトを返す。
+    呼び出しスレッドごとにキャッシュされるので、何度呼んでもディスクI/Oや
+    discovery document の取得は発生しない。
+    """
+    creds = get_credentials(token_file, credentials_file, scopes)
+    services = getattr(_local, 'services', None)
+    if services is None:
+        services = _local.services = {}
+
+    key = (api, version, token_file, tuple(scopes))
+    cached = services.get(key)
+    if cached is None or cached[0] is not creds:
+        service = build_from_document(_discovery_document(api, version), credentials=creds)
+        cached = services[key] = (creds, service)
+    return cached[1]
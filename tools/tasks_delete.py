@@ -1,8 +1,5 @@
-import os
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from tools.google_service import get_service
+from tools import tasks_store
 from langchain.tools import Tool
 
 SCOPES = ['https://www.googleapis.com/auth/tasks']
@@ -10,28 +7,17 @@ CREDENTIALS_FILE = 'client_secret_writer.json'
 TOKEN_FILE = 'token_tasks.json'
 
 def authorize_google_tasks():
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_FILE, 'w') as token:
-            token.write(creds.to_json())
-    return build('tasks', 'v1', credentials=creds)
+    return get_service('tasks', 'v1', SCOPES, TOKEN_FILE, CREDENTIALS_FILE)
 
 def delete_task(task_id: str) -> str:
     try:
         service = authorize_google_tasks()
-        tasklists = service.tasklists().list().execute().get('items', [])
-        if not tasklists:
+        tasklist_id = tasks_store.default_tasklist_id(service)
+        if not tasklist_id:
             return "❌ タスクリストが存在しません。"
 
-        tasklist_id = tasklists[0]['id']
         service.tasks().delete(tasklist=tasklist_id, task=task_id).execute()
+        tasks_store.delete_task(tasklist_id, task_id)
         return f"🗑️ タスク（ID: {task_id}）を削除しました。"
     except Exception as e:
         return f"❌ タスク削除中にエラー: {e}"
@@ -1,8 +1,5 @@
-import os
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from tools.google_service import get_service
+from tools import tasks_store
 from langchain.tools import Tool
 from datetime import datetime
 
@@ -11,30 +8,21 @@ CREDENTIALS_FILE = 'client_secret_writer.json'
 TOKEN_FILE = 'token_tasks.json'
 
 def authorize_google_tasks():
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_FILE, 'w') as token:
-            token.write(creds.to_json())
-    return build('tasks', 'v1', credentials=creds)
+    return get_service('tasks', 'v1', SCOPES, TOKEN_FILE, CREDENTIALS_FILE)
 
 def list_tasks(_: str) -> str:
     try:
         service = authorize_google_tasks()
-        tasklists = service.tasklists().list().execute().get('items', [])
+        tasklists = tasks_store.get_tasklists(service)
         if not tasklists:
             return "📭 タスクリストが見つかりません。"
 
         output = []
         for tasklist in tasklists:
             output.append(f"\n🗂 タスクリスト: {tasklist['title']}")
-            tasks = service.tasks().list(tasklist=tasklist['id'], showCompleted=True).execute().get('items', [])
+            if tasks_store.needs_sync(tasklist['id']):
+                tasks_store.sync_tasklist(service, tasklist['id'])
+            tasks = tasks_store.query_tasks(tasklist['id'])
             if not tasks:
                 output.append("  - タスクなし")
             for task in tasks:
@@ -54,7 +42,7 @@ tasks_read_tool = Tool.from_function(
     name="TasksReader",
     func=list_tasks,
     description=(
-        "Google Tasks の全タスク一覧を表示します。\n"
+        "Google Tasks の全タスク一覧を表示します（完了済みは直近のもののみ）。\n"
         "期限・完了状態・IDも一緒に表示されるので、削除や確認に使ってください。\n"
     )
 )
\ No newline at end of file
@@ -0,0 +1,219 @@
+import time
+import sqlite3
+import datetime
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Optional
+
+# Google Tasks のローカルインデックス（SQLite）。
+# タスクリストIDを覚えておき、タスクは updatedMin による差分同期で更新する。
+# 完了から COMPLETED_RETENTION_DAYS 日以上経ったタスクは取り込まない。
+
+DB_FILE = 'tasks_cache.db'
+SYNC_INTERVAL = 60                  # 差分同期の最小間隔（秒）
+TASKLIST_TTL = 24 * 60 * 60         # タスクリスト一覧を再取得する間隔（秒）
+COMPLETED_RETENTION_DAYS = 30       # None にすると完了済みタスクをすべて保持する
+UPDATED_MIN_MARGIN = datetime.timedelta(seconds=30)  # 時計ずれ対策
+
+_lock = threading.Lock()
+_initialized = False
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasklists (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    title TEXT,
+    updated_min TEXT,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    tasklist_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    title TEXT,
+    due TEXT,
+    status TEXT,
+    completed TEXT,
+    position TEXT,
+    PRIMARY KEY (tasklist_id, task_id)
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_completed ON tasks (tasklist_id, status, completed);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL
+);
+"""
+
+
+def _connect():
+    global _initialized
+    conn = sqlite3.connect(DB_FILE, timeout=10)
+    conn.row_factory = sqlite3.Row
+    if not _initialized:
+        conn.executescript(SCHEMA)
+        _initialized = True
+    return conn
+
+
+@contextmanager
+def _db():
+    conn = _connect()
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _rfc3339(dt: datetime.datetime) -> str:
+    return dt.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def _completed_cutoff() -> Optional[str]:
+    if COMPLETED_RETENTION_DAYS is None:
+        return None
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return _rfc3339(now - datetime.timedelta(days=COMPLETED_RETENTION_DAYS))
+
+
+def _apply_tasks(conn, tasklist_id: str, tasks: List[Dict]):
+    for task in tasks:
+        if task.get("deleted"):
+            conn.execute(
+                "DELETE FROM tasks WHERE tasklist_id = ? AND task_id = ?", (tasklist_id, task["id"])
+            )
+            continue
+        conn.execute(
+            "INSERT OR REPLACE INTO tasks (tasklist_id, task_id, title, due, status, completed, position) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (tasklist_id, task["id"], task.get("title"), task.get("due"),
+             task.get("status", "needsAction"), task.get("completed"), task.get("position")),
+        )
+
+
+def _prune_completed(conn, tasklist_id: str):
+    cutoff = _completed_cutoff()
+    if cutoff:
+        conn.execute(
+            "DELETE FROM tasks WHERE tasklist_id = ? AND status = 'completed' AND completed < ?",
+            (tasklist_id, cutoff),
+        )
+
+
+# === タスクリスト ===
+def get_tasklists(service) -> List[Dict]:
+    """キャッシュ済みのタスクリスト一覧を返す。TASKLIST_TTL を過ぎていれば取り直す"""
+    with _db() as conn:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'tasklists_synced_at'").fetchone()
+        if row is not None and time.time() - row["value"] <= TASKLIST_TTL:
+            rows = conn.execute("SELECT id, title FROM tasklists ORDER BY position").fetchall()
+            return [{"id": r["id"], "title": r["title"]} for r in rows]
+
+    tasklists = service.tasklists().list().execute().get('items', [])
+    with _lock, _db() as conn:
+        ids = [tl["id"] for tl in tasklists]
+        placeholders = ",".join("?" * len(ids)) or "''"
+        conn.execute(f"DELETE FROM tasks WHERE tasklist_id NOT IN ({placeholders})", ids)
+        conn.execute(f"DELETE FROM tasklists WHERE id NOT IN ({placeholders})", ids)
+        for position, tl in enumerate(tasklists):
+            conn.execute(
+                "INSERT INTO tasklists (id, position, title) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET position = excluded.position, title = excluded.title",
+                (tl["id"], position, tl.get("title")),
+            )
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('tasklists_synced_at', ?)", (time.time(),)
+        )
+    return [{"id": tl["id"], "title": tl.get("title")} for tl in tasklists]
+
+
+def default_tasklist_id(service) -> Optional[str]:
+    tasklists = get_tasklists(service)
+    return tasklists[0]["id"] if tasklists else None
+
+
+# === 同期 ===
+def needs_sync(tasklist_id: str) -> bool:
+    with _db() as conn:
+        row = conn.execute("SELECT synced_at FROM tasklists WHERE id = ?", (tasklist_id,)).fetchone()
+    return row is None or row["synced_at"] is None or time.time() - row["synced_at"] > SYNC_INTERVAL
+
+
+def _list_all(service, **params) -> List[Dict]:
+    items = []
+    page_token = None
+    while True:
+        result = service.tasks().list(maxResults=100, pageToken=page_token, **params).execute()
+        items.extend(result.get('items', []))
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            return items
+
+
+def sync_tasklist(service, tasklist_id: str):
+    """
+    タスクリスト1つ分をインデックスに同期する。
+    初回は未完了タスクと保持期間内の完了済みタスクだけを取得し、
+    以降は前回同期以降に更新されたタスク（削除を含む）だけを取得する。
+    """
+    with _db() as conn:
+        row = conn.execute("SELECT updated_min FROM tasklists WHERE id = ?", (tasklist_id,)).fetchone()
+    updated_min = row["updated_min"] if row else None
+
+    started = datetime.datetime.now(datetime.timezone.utc) - UPDATED_MIN_MARGIN
+    if updated_min:
+        tasks = _list_all(
+            service, tasklist=tasklist_id, updatedMin=updated_min,
+            showCompleted=True, showHidden=True, showDeleted=True,
+        )
+        full_sync = False
+    else:
+        tasks = _list_all(service, tasklist=tasklist_id, showCompleted=False)
+        completed_params = {"completedMin": _completed_cutoff()} if COMPLETED_RETENTION_DAYS is not None else {}
+        tasks += _list_all(
+            service, tasklist=tasklist_id, showCompleted=True, showHidden=True, **completed_params
+        )
+        full_sync = True
+
+    with _lock, _db() as conn:
+        if full_sync:
+            conn.execute("DELETE FROM tasks WHERE tasklist_id = ?", (tasklist_id,))
+        _apply_tasks(conn, tasklist_id, tasks)
+        _prune_completed(conn, tasklist_id)
+        conn.execute(
+            "UPDATE tasklists SET updated_min = ?, synced_at = ? WHERE id = ?",
+            (_rfc3339(started), time.time(), tasklist_id),
+        )
+
+
+# === 読み取り ===
+def query_tasks(tasklist_id: str) -> List[Dict]:
+    cutoff = _completed_cutoff()
+    with _db() as conn:
+        rows = conn.execute(
+            "SELECT task_id, title, due, status, completed FROM tasks "
+            "WHERE tasklist_id = ? AND (status != 'completed' OR ? IS NULL OR completed >= ?) "
+            "ORDER BY position",
+            (tasklist_id, cutoff, cutoff),
+        ).fetchall()
+    tasks = []
+    for r in rows:
+        task = {"id": r["task_id"], "status": r["status"]}
+        if r["title"] is not None:
+            task["title"] = r["title"]
+        if r["due"] is not None:
+            task["due"] = r["due"]
+        tasks.append(task)
+    return tasks
+
+
+# === 書き込みの即時反映 ===
+def upsert_task(tasklist_id: str, task: Dict):
+    with _lock, _db() as conn:
+        _apply_tasks(conn, tasklist_id, [task])
+
+
+def delete_task(tasklist_id: str, task_id: str):
+    with _lock, _db() as conn:
+        conn.execute(
+            "DELETE FROM tasks WHERE tasklist_id = ? AND task_id = ?", (tasklist_id, task_id)
+        )
@@ -1,10 +1,7 @@
-import os
 from datetime import datetime, timedelta
 from dateutil import parser
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from tools.google_service import get_service
+from tools import tasks_store
 from langchain.tools import Tool
 
 SCOPES = ['https://www.googleapis.com/auth/tasks']
@@ -12,18 +9,7 @@ CREDENTIALS_FILE = 'client_secret_writer.json'
 TOKEN_FILE = 'token_tasks.json'
 
 def authorize_google_tasks():
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_FILE, 'w') as token:
-            token.write(creds.to_json())
-    return build('tasks', 'v1', credentials=creds)
+    return get_service('tasks', 'v1', SCOPES, TOKEN_FILE, CREDENTIALS_FILE)
 
 def add_task(input_text: str) -> str:
     """
@@ -32,10 +18,9 @@ def add_task(input_text: str) -> str:
     """
     try:
         service = authorize_google_tasks()
-        tasklists = service.tasklists().list().execute().get('items', [])
-        if not tasklists:
+        tasklist_id = tasks_store.default_tasklist_id(service)
+        if not tasklist_id:
             return "❌ タスクリストが存在しません。"
-        tasklist_id = tasklists[0]['id']
 
         parts = input_text.strip().split(" ", 2)
 
@@ -62,6 +47,7 @@ def add_task(input_text: str) -> str:
 
         task = {'title': title, 'due': due}
         created = service.tasks().insert(tasklist=tasklist_id, body=task).execute()
+        tasks_store.upsert_task(tasklist_id, created)
         return f"✅ タスクを追加しました: {created['title']}（ID: {created['id']}）"
 
     except Exception as e:
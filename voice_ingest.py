@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import wave
+import base64
+import argparse
+import threading
+import numpy as np
+import discord
+from akari_vad import SAMPLE_RATE, FRAME_BYTES, SILENCE_TIMEOUT, STREAMING, PARTIAL_STRIDE, VadSegmenter
+
+# Discord の VC で受信した音声を話者ごとに発話区間へ区切る。
+# 受信した Opus パケットを SSRC ごとにデコードし（48kHz ステレオ）、16kHz モノラルに変換して
+# 話者ごとの VadSegmenter に流す。区切れた発話区間は on_segment(user_id, 音声, 確定か, 開始秒) に渡す。
+# Discord は無音のあいだパケットを送らないので、届かない時間は無音で埋めて発話の終わりを検出する。
+#
+# AKARI_VOICE_CAPTURE を指定すると受信したパケットを JSON Lines で保存し、
+#   python voice_ingest.py capture.jsonl --wav-dir segments/
+# で同じデコードと区切りを再生して確かめられる。
+
+DISCORD_SAMPLE_RATE = 48000
+DISCORD_CHANNELS = 2
+DECIMATION = DISCORD_SAMPLE_RATE // SAMPLE_RATE
+TICK_INTERVAL = 0.1  # 無音を埋める間隔（秒）
+MIN_SILENCE_GAP = 0.06  # これより短い間隔はパケットの揺らぎとみなして埋めない（秒）
+MAX_SILENCE_PAD = SILENCE_TIMEOUT + 0.5  # 長い無音は発話の終わりが分かる長さまでに詰める（秒）
+CAPTURE_PATH = os.getenv("AKARI_VOICE_CAPTURE")
+
+
+def to_16k_mono(pcm: bytes) -> bytes:
+    """48kHz ステレオの PCM を 16kHz モノラルにする（左右と連続3サンプルの平均で簡易的に帯域を落とす）"""
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.int32)
+    group = DISCORD_CHANNELS * DECIMATION
+    usable = len(samples) // group * group
+    mono = samples[:usable].reshape(-1, group).mean(axis=1)
+    return mono.astype(np.int16).tobytes()
+
+
+class SpeakerStream:
+    """1人の話者（SSRC）の Opus デコーダーと発話区間の切り出し"""
+
+    def __init__(self, ssrc: int, user_id, partial_stride: float = None):
+        self.ssrc = ssrc
+        self.user_id = user_id
+        self.decoder = discord.opus.Decoder()
+        self.segmenter = VadSegmenter(partial_stride)
+        self.buffer = b""
+        self.clock = None     # ここまでの音声を受け取った時刻
+        self.silence = 0.0    # 最後のパケットのあとに埋めた無音の長さ
+        self.idle = True      # 発話が終わって無音を埋める必要がない
+
+    def _push(self, pcm: bytes) -> list:
+        self.buffer += pcm
+        events = []
+        while len(self.buffer) >= FRAME_BYTES:
+            frame, self.buffer = self.buffer[:FRAME_BYTES], self.buffer[FRAME_BYTES:]
+            events.extend(self.segmenter.push(frame))
+        return events
+
+    def feed(self, packet: bytes, now: float) -> list:
+        self.clock = now
+        self.silence = 0.0
+        self.idle = False
+        return self._push(to_16k_mono(self.decoder.decode(packet)))
+
+    def pad_silence(self, now: float) -> list:
+        if self.idle or self.clock is None:
+            return []
+        gap = min(now - self.clock, MAX_SILENCE_PAD - self.silence)
+        if gap < MIN_SILENCE_GAP:
+            return []
+        self.clock = now
+        self.silence += gap
+        events = self._push(bytes(int(gap * SAMPLE_RATE) * 2))
+        if self.silence >= MAX_SILENCE_PAD - MIN_SILENCE_GAP and not self.segmenter.triggered:
+            self.idle = True
+        return events
+
+    def flush(self) -> list:
+        return self.segmenter.flush()
+
+
+class VoiceIngest:
+    """SSRC ごとの SpeakerStream をまとめ、受信スレッドやタイマーから呼ばれても安全に区切る"""
+
+    def __init__(self, on_segment, partial_stride: float = None, capture_path: str = CAPTURE_PATH):
+        self.on_segment = on_segment
+        self.partial_stride = partial_stride
+        self.streams = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._capture = open(capture_path, "a", encoding="utf-8") if capture_path else None
+
+    def _dispatch(self, user_id, events):
+        for audio, final, start in events:
+            self.on_segment(user_id, audio, final, start)
+
+    def feed(self, ssrc: int, user_id, packet: bytes, now: float = None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            stream = self.streams.get(ssrc)
+            if stream is None:
+                stream = self.streams[ssrc] = SpeakerStream(ssrc, user_id, self.partial_stride)
+            elif user_id is not None:
+                stream.user_id = user_id  # 話者が後から分かることがある
+            if self._capture:
+                self._capture.write(json.dumps({
+                    "t": now, "ssrc": ssrc, "user": stream.user_id,
+                    "opus": base64.b64encode(packet).decode("ascii"),
+                }) + "\n")
+            events = stream.feed(packet, now)
+        self._dispatch(stream.user_id, events)
+
+    def tick(self, now: float = None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            pending = [(stream.user_id, stream.pad_silence(now)) for stream in self.streams.values()]
+        for user_id, events in pending:
+            self._dispatch(user_id, events)
+
+    def start(self):
+        self._stopped.clear()
+        threading.Thread(target=self._run_ticker, daemon=True).start()
+
+    def _run_ticker(self):
+        while not self._stopped.wait(TICK_INTERVAL):
+            self.tick()
+
+    def stop(self):
+        self._stopped.set()
+        with self._lock:
+            pending = [(stream.user_id, stream.flush()) for stream in self.streams.values()]
+            self.streams.clear()
+            if self._capture:
+                self._capture.flush()
+        for user_id, events in pending:
+            self._dispatch(user_id, events)
+
+
+def create_sink(ingest: VoiceIngest):
+    """
+    受信音声を Opus のまま VoiceIngest に渡す AudioSink を作る（デコードは話者ごとに行う）。
+    discord-ext-voice-recv は VC の受信を使うときだけ必要なので、ここで読み込む。
+    """
+    from discord.ext import voice_recv
+
+    class IngestSink(voice_recv.AudioSink):
+        def __init__(self):
+            super().__init__()
+            self.ingest = ingest
+
+        def wants_opus(self) -> bool:
+            return True
+
+        def write(self, user, data):
+            self.ingest.feed(data.packet.ssrc, user.id if user else None, data.opus)
+
+        def cleanup(self):
+            self.ingest.stop()
+
+    return IngestSink()
+
+
+def create_ingest(on_segment) -> VoiceIngest:
+    return VoiceIngest(on_segment, PARTIAL_STRIDE if STREAMING else None)
+
+
+def replay(path: str, wav_dir: str = None):
+    """保存したパケットを受信したときと同じ順番・時刻でデコードして区切り、確定した発話区間を表示する"""
+    segments = []
+
+    def on_segment(user_id, audio, final, start):
+        if not final:
+            return
+        duration = len(audio) / 2 / SAMPLE_RATE
+        print(f"speaker={user_id} start={start:.2f}s duration={duration:.2f}s")
+        if wav_dir:
+            os.makedirs(wav_dir, exist_ok=True)
+            with wave.open(os.path.join(wav_dir, f"{len(segments):03d}_{user_id}.wav"), "wb") as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(SAMPLE_RATE)
+                wav.writeframes(audio)
+        segments.append((user_id, start, duration))
+
+    ingest = VoiceIngest(on_segment, capture_path=None)
+    now = 0.0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            packet = json.loads(line)
+            now = packet["t"]
+            ingest.tick(now)
+            ingest.feed(packet["ssrc"], packet["user"], base64.b64decode(packet["opus"]), now)
+    ingest.tick(now + MAX_SILENCE_PAD)
+    ingest.stop()
+    print(f"{len(segments)} 区間, 話者 {len({user_id for user_id, _, _ in segments})} 人")
+    return segments
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="保存した Opus パケットを再生して発話区間の区切りを確かめる")
+    parser.add_argument("capture", help="AKARI_VOICE_CAPTURE で保存した JSON Lines")
+    parser.add_argument("--wav-dir", help="区切った発話区間を WAV で書き出すディレクトリ")
+    args = parser.parse_args()
+    replay(args.capture, args.wav_dir)